@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 
 import argparse
-import glob
 import itertools
 import os
 import os.path
-import re
 import sys
 
 from collections import OrderedDict
 
+from sve_analysis import memory, memtrace, opcodes, pipeline, profiling
+
 def parse_args():
   parser = argparse.ArgumentParser()
 
@@ -39,119 +39,25 @@ def parse_args():
   op_count_group.add_argument('-t', '--threshold', type=int, default=20, metavar='T',
                               help='highlight opcodes only when differences are above %(metavar)s%% (default: %(default)s)')
   op_count_group.add_argument('--min-count', type=int, default=1000, metavar='N',
-                              help='highlight opcodes only they appear at least %(metavar)s times (default: %(default)s)')
+                              help='highlight opcodes only they appear at least %(metavar)s times; with --hotspots, rank partial-lane ratios only for instructions with at least %(metavar)s SVE contiguous accesses (default: %(default)s)')
+
+  # Mem Count options
+  mem_count_group = parser.add_argument_group('mem-count options')
+  mem_count_group.add_argument('--timeline', type=int, metavar='N',
+                               help='split the SVE memory trace into windows of %(metavar)s accesses and report the access mix of each window')
+  mem_count_group.add_argument('--gather-scatter', action='store_true',
+                               help='group gathers and scatters with their elements, and report elements, bytes, cache lines and strides')
+  mem_count_group.add_argument('--hotspots', action='store_true',
+                               help='rank instructions and functions by memory accesses, gathers/scatters and partial-lane accesses; use with -n and --min-count')
+
+  profiling.add_arguments(parser)
 
   # Positional
   parser.add_argument('results', help='path to a results directory')
 
   return parser.parse_args()
 
-# Gets a list of binaries for which results have been collected in a given directory
-# Assumes that the wrapper script has generated binaries.lst
-# Retuns 1) the actual file names, 2) the patters used to invoke the wrapper script, 3) the readable name of each version
-def get_binaries(results):
-  with open('/'.join((results,'binaries.lst'))) as f:
-    root     = f.readlines(1)[0].strip()
-    binaries = [b.strip() for b in f.readlines()]
-    versions = [b.replace(root, '')[1:] for b in binaries]
-
-  return binaries, root, versions
-
-
 ###### opcodes ######
-class Ops:
-  def __init__(self):
-    self.opcodes     = {}
-    self.opcounts    = None
-    self.top_ops     = None
-    self.top_counts  = None
-    self.total_ops   = 0
-    self.unique_ops  = 0
-
-    self.total_a64  = 0
-    self.min_a64    = 0 # Legacy
-    self.total_neon = 0
-
-  # Parses decoded.txt, undecoded.txt, and a64-count.tx (if available) to obtain instruction counts
-  @classmethod
-  def for_binary(cls, binary):
-    ops = Ops()
-
-    undecoded_file = 'undecoded_'+binary+'.txt'
-    if os.path.exists(undecoded_file):
-      # Parse decoded.txt to map instruction words to ops
-      inst_to_op = {}
-      with open('decoded_'+binary+'.txt', 'r') as decoded:
-        for line in decoded:
-          parts            = re.split(r'\s+', line.strip())
-          inst, op         = parts[0], parts[2]
-          inst_to_op[inst] = op
-
-      # Parse undecoded.txt to count insutrctions
-      with open('undecoded_'+binary+'.txt', 'r') as undecoded:
-        for line in undecoded:
-          count, inst = line.strip().replace(' ', '').split(':')
-          count       = int(count)
-          op          = inst_to_op[inst]
-
-          ops.opcodes[op]  = ops.opcodes.get(op, 0) + count
-          ops.total_ops   += count
-
-    # Make an ordered inverse mapping (from counts to ops), so that it's easy to get top N
-    if ops.total_ops > 0:
-      ops.top_ops, ops.top_counts = zip(*sorted(ops.opcodes.items(), key=lambda x: x[1], reverse=True))
-    else:
-      ops.top_ops, ops.top_counts = (), ()
-    ops.total_ops  = sum(ops.top_counts)
-    ops.unique_ops = len(ops.top_counts)
-
-    a64_count_file = 'a64-count_'+binary+'.txt'
-    if os.path.exists(a64_count_file):
-      # Get the total number of scalar A64 and NEON instructions from a64-count, if available
-      with open(a64_count_file, 'r') as out:
-        for line in out:
-          if line.startswith('Total instructions:'):
-            ops.total_a64 = int(line.split(' ')[-1].replace(',', ''))
-          elif line.startswith('Vector instructions (v and q):'):
-            ops.total_neon = int(line.split(' ')[-2].replace(',', ''))
-    else:
-      # Get the approximate total number of A64 instructions from the opcodes client
-      with open('opcodes_'+binary+'.out', 'r') as out:
-        lines = out.read().splitlines()
-        start = lines.index('Opcode execution counts in AArch64 mode:')
-        end   = [idx for idx,s in enumerate(lines) if 'unique emulated instructions written to undecoded.txt' in s][0]
-        lines = lines[start+1:end]
-
-        ops.min_a64 = int(lines[0].strip().split(' ')[0])
-        for line in lines:
-          parts = re.split(r'\s+', line.strip())
-          count, op = int(parts[0]), parts[2]
-
-          ops.total_a64 += count
-
-    return ops
-
-  def get_nth_most_used(self, n):
-    return self.top_ops[n-1], self.top_counts[n-1]
-
-  def get_total(self):
-    return self.total_ops
-
-  def get_unique_ops_count(self):
-    return self.unique_ops
-
-  def get_op_count(self, op):
-    return self.opcodes.get(op, 0)
-
-  def get_a64_count(self):
-    return self.total_a64, self.min_a64
-
-  def get_neon_count(self):
-    return self.total_neon
-
-  def get_scalar_count(self):
-    return self.total_a64 - self.total_neon
-
 # Checks pairs of results for operands the appear predominantly in one side
 def highlight_ops(binaries, ops, names, threshold, min_count, N):
   for b1,b2 in itertools.combinations(binaries,2):
@@ -192,9 +98,14 @@ def plot_ops(binaries, opsmap, namesmap, top_ops, app, fname):
   top_ops_list = list(top_ops)
   counts = {op: [opsmap[b].get_op_count(op) / 1e6 for b in binaries] for op in top_ops_list}
 
-  # Add all A64 instructions as a single (fake) op type
-  top_ops_list.append('A64')
-  counts['A64'] = [opsmap[b].get_a64_count()[0] / 1e6 for b in binaries]
+  if all(opsmap[b].isa == 'sve' for b in binaries):
+    # Add all A64 instructions as a single (fake) op type
+    top_ops_list.append('A64')
+    counts['A64'] = [opsmap[b].get_a64_count()[0] / 1e6 for b in binaries]
+  else:
+    # A64 opcodes are already in the top ops, so add the rest of the counted instructions as a single (fake) op type
+    top_ops_list.append('other')
+    counts['other'] = [(opsmap[b].get_total() - sum(opsmap[b].get_op_count(op) for op in top_ops)) / 1e6 for b in binaries]
 
   index = pd.Index([n.replace('-trace', '') for n in namesmap.values()], name='op')
   df    = pd.DataFrame(counts, index=index)
@@ -213,25 +124,17 @@ def plot_ops(binaries, opsmap, namesmap, top_ops, app, fname):
   plt.savefig(fname)
 
 def export_ops(binaries, opsmap, namesmap, app, fname):
-  import pandas as pd
-
-  data  = [{'application': app, 'version': namesmap[b], 'op': op, 'count': count}  for b in binaries for op, count in opsmap[b].opcodes.items()]
-  data += [{'application': app, 'version': namesmap[b], 'op': 'A64', 'count': opsmap[b].get_scalar_count()} for b in binaries]
-  data += [{'application': app, 'version': namesmap[b], 'op': 'NEON', 'count': opsmap[b].get_neon_count()} for b in binaries]
-
-  df = pd.DataFrame(data)
-  df.to_pickle(fname + '.pickle')
-  df.to_csv(fname + '.csv', index=False, columns=['application', 'version', 'op', 'count'])
+  pipeline.save(opcodes.to_frame(binaries, opsmap, namesmap, app), fname)
   print("Exported to", fname+'.pickle', "and", fname+'.csv')
 
-# Shows the top N SVE opcodes used in a binary
-def sve_count(binaries, highlight, threshold, min_count, graph, export, N, app, names=None):
+# Shows the top N opcodes of the given instruction set(s) used in a binary
+def sve_count(binaries, highlight, threshold, min_count, graph, export, N, app, names=None, isa='sve'):
   namesmap     = {b: name for b,name in zip(binaries, names if names else binaries)}
   opsmap       = {}
   all_top_ops = set()
 
   for b in binaries:
-    ops         = Ops.for_binary(b)
+    ops         = opcodes.Ops.for_binary(b, isa)
     opsmap[b]   = ops
     total       = ops.get_total()
 
@@ -239,7 +142,9 @@ def sve_count(binaries, highlight, threshold, min_count, graph, export, N, app,
 
     print("Version:", namesmap[b])
     print("  Total A64 instructions executed: {:,} + O({:,})".format(a64_total, a64_error))
-    print("  Total SVE instructions executed: {:,}".format(total))
+    print("  Total SVE instructions executed: {:,}".format(ops.get_sve_total()))
+    if isa != 'sve':
+      print("  Total NEON instructions executed: {:,}".format(ops.get_neon_count()))
     print("  Top ops executed:")
 
     for i in range(1, min(N, ops.get_unique_ops_count())+1):
@@ -253,111 +158,178 @@ def sve_count(binaries, highlight, threshold, min_count, graph, export, N, app,
 
   if graph:
     fname = 'opcount.png'
-    plot_ops(binaries, opsmap, namesmap, all_top_ops, app, fname)
+    with profiling.stage('plot'):
+      plot_ops(binaries, opsmap, namesmap, all_top_ops, app, fname)
     print("Plot saved to", fname)
 
   if export:
     fname = 'ops'
-    export_ops(binaries, opsmap, namesmap, app, fname)
+    with profiling.stage('export'):
+      export_ops(binaries, opsmap, namesmap, app, fname)
 
 
 ###### memtrace ######
-class MemTrace:
-  def __init__(self):
-    self.total_mem_ops  = 0
-    self.total_reads    = 0
-    self.total_gathers  = 0
-    self.read_sizes     = {}
-    self.total_writes   = 0
-    self.total_scatters = 0
-    self.write_sizes    = {}
-    # TODO: maybe do something with locations
-
-  @classmethod
-  def for_binary(cls, binary):
-    mem = MemTrace()
-
-    tracefiles = glob.glob('sve-memtrace.' + binary + '*.log')
-    assert len(tracefiles) == 1
-    with open(tracefiles[0], 'r') as f:
-      for line in f:
-        parts = line.strip().split(', ')
-        bundle, is_write, size = (int(p) for p in parts[2:5])
-
-        if size == 0 or int(parts[1]) < 0:
-          # ArmIE sometimes outputs artifacts at the beginning and end of a trace; we skip over them
-          continue
-        if bundle >=2:
-          # We don't currently do anything with the comprising parts of gathers and scatters
-          # TODO: we may need to count inner elements to determine the total size of a g/s
-          continue
-
-        mem.total_mem_ops += 1
-        if is_write:
-          mem.total_writes += 1
-          assert bundle in (0,3)
-          if bundle == 3:
-            mem.total_scatters += 1
-          mem.write_sizes[size] = mem.write_sizes.get(size, 0) + 1
-        else:
-          mem.total_reads += 1
-          assert bundle in (0,1)
-          if bundle == 1:
-            mem.total_gathers += 1
-          mem.read_sizes[size] = mem.read_sizes.get(size, 0) + 1
-
-    return mem
-
-
-# The memc-count functionality is deprecated. Use the instrace tools instead
-def legacy_mem_count(binaries, N, names=None):
-  for b,name in zip(binaries, names if names else binaries):
-    memtrace      = MemTrace.for_binary(b)
-    total         = memtrace.total_mem_ops
-    reads, writes = memtrace.total_reads, memtrace.total_writes
-    gath, scat    = memtrace.total_gathers, memtrace.total_scatters
-
-    print("Version:", name)
-    print("  Total SVE memory operations: {:,}".format(total))
-
-    if total > 0:
-      print("    Total SVE reads: {:,} ({:.2f}% of ops)".format(reads, reads/total*100))
-      if reads > 0:
-        print("      By size:", ', '.join("{}: {:,} ({}%)".format(s*8, n, n//reads*100) for s, n in sorted(memtrace.read_sizes.items())))
-        print("      Total SVE gathers: {:,} ({:.2f}% of reads, {:.2f}% of ops)".format(
-          gath, gath/reads*100, gath/total*100))
-
-      print("    Total SVE writes: {:,} ({:.2f}% of ops)".format(writes, writes/total*100))
-      if reads > 0:
-        print("      By size:", ', '.join("{}: {:,} ({}%)".format(s*8, n, n//writes*100) for s, n in sorted(memtrace.write_sizes.items())))
-        print("      Total SVE scatters: {:,} ({:.2f}% of writes, {:.2f}% of ops)".format(
-          scat, scat/writes*100, scat/total*100))
-    print()
+# Prints the SVE memory operations of a binary, by direction and size
+def print_mem(mem, name):
+  total         = mem.total_mem_ops
+  reads, writes = mem.total_reads, mem.total_writes
+  gath, scat    = mem.total_gathers, mem.total_scatters
+
+  print("Version:", name)
+  print("  Total SVE memory operations: {:,}".format(total))
+
+  if total > 0:
+    print("    Total SVE reads: {:,} ({:.2f}% of ops)".format(reads, reads/total*100))
+    if reads > 0:
+      print("      By size:", ', '.join("{}: {:,} ({:.2f}%)".format(s*8, n, n/reads*100) for s, n in sorted(mem.read_sizes.items())))
+      print("      Total SVE gathers: {:,} ({:.2f}% of reads, {:.2f}% of ops)".format(
+        gath, gath/reads*100, gath/total*100))
+      print_gather_scatter(mem.gather_scatter, 'gather')
+
+    print("    Total SVE writes: {:,} ({:.2f}% of ops)".format(writes, writes/total*100))
+    if writes > 0:
+      print("      By size:", ', '.join("{}: {:,} ({:.2f}%)".format(s*8, n, n/writes*100) for s, n in sorted(mem.write_sizes.items())))
+      print("      Total SVE scatters: {:,} ({:.2f}% of writes, {:.2f}% of ops)".format(
+        scat, scat/writes*100, scat/total*100))
+      print_gather_scatter(mem.gather_scatter, 'scatter')
+  print()
+
+# Prints the elements, bytes, cache lines and stride patterns of the gathers or scatters in a summary from memtrace.gather_scatter
+def print_gather_scatter(summary, type):
+  df  = summary[summary.type == type]
+  ops = df.operations.sum()
+  if ops == 0:
+    return
+
+  elements = (df.elements * df.operations).sum()
+  lines    = (df.lines * df.operations).sum()
+  print("        Elements per op: {:.2f} (min {}, max {})".format(elements/ops, df.elements.min(), df.elements.max()))
+  print("        Bytes moved: {:,} ({:.2f} per op)".format(df.bytes.sum(), df.bytes.sum()/ops))
+  print("        Distinct cache lines per op: {:.2f} ({:.2f} elements per line, {:.2f}% of the bytes of the lines used)".format(
+    lines/ops, elements/lines, df.bytes.sum()/df['cache-bytes'].sum()*100))
+
+  patterns = df.groupby('pattern').operations.sum().sort_values(ascending=False)
+  print("        By stride pattern:", ', '.join("{}: {:,} ({:.2f}%)".format(p, n, n/ops*100) for p, n in patterns.items()))
+  strides = df[df.pattern == 'strided'].groupby('stride').operations.sum().sort_values(ascending=False)
+  if len(strides) > 0:
+    print("        Top strides:", ', '.join("{:,}B: {:,}".format(int(s), n) for s, n in strides.head(4).items()))
+
+# Groups the gathers and scatters of each binary with their elements, and prints and optionally exports a summary
+def gather_scatter_count(binaries, namesmap, app, export, fname):
+  mems = {}
+  for b in binaries:
+    mems[b] = memory.MemTrace.for_binary(b)
+    print_mem(mems[b], namesmap[b])
 
+  if export:
+    with profiling.stage('export'):
+      pipeline.save(memory.gather_scatter_frame(mems, namesmap, app), fname)
+    print(f"Exported gather/scatter data to {fname}.pickle and {fname}.csv")
 
 def export_mem(binaries, namesmap, app, fname):
-  import pandas as pd
-
   for instrace_tool in ['analyze', 'bundle']:
-    df = pd.DataFrame()
-
-    for b in binaries:
-      df_b = pd.read_csv('.'.join([instrace_tool, b, 'csv']))
-      df_b['version'] = namesmap[b]
-      df = df.append(df_b, ignore_index=True)
-    df['application'] = app
+    df = memory.instrace_frame(binaries, namesmap, app, instrace_tool)
 
     fname_df = f"{fname}-{instrace_tool}"
-    df.to_pickle(fname_df + '.pickle')
-    df.to_csv(fname_df + '.csv', index=False)
+    with profiling.stage('export'):
+      pipeline.save(df, fname_df)
     print(f"Exported {instrace_tool} data to {fname_df}.pickle and {fname_df}.csv")
 
-def mem_count(binaries, export, N, app, names=None):
+# Exports the access mix of each window of `window` SVE memory accesses over the run of each binary
+def timeline_count(binaries, namesmap, app, window, svewidth, export, fname):
+  df = memory.timeline_frame(binaries, namesmap, app, window, svewidth)
+
+  for b in binaries:
+    df_b = df[df.version == namesmap[b]]
+    print("Version:", namesmap[b])
+    print("  Windows of {:,} SVE memory accesses: {:,}".format(window, len(df_b)))
+    if len(df_b) > 0:
+      print("  All-lanes contiguous accesses per window: {:.2f}% to {:.2f}%".format(
+        df_b['pct-contig-alllanes'].min(), df_b['pct-contig-alllanes'].max()))
+      print("  Gather/scatter share per window: {:.2f}% to {:.2f}%".format(
+        df_b['pct-gather-scatter'].min(), df_b['pct-gather-scatter'].max()))
+
+  if export:
+    with profiling.stage('export'):
+      pipeline.save(df, fname)
+    print(f"Exported timeline data to {fname}.pickle and {fname}.csv")
+
+# Formats a row of a hotspots table for printing, with the share of the total accesses
+def format_hotspot(r, total):
+  return "{:>11,} ({:5.2f}%), gathers/scatters: {:,}, partial-lane: {}".format(
+    r['accesses'], r['accesses']/total*100, r['gathers'] + r['scatters'],
+    '-' if r['sve-contiguous'] == 0 else '{:.2f}%'.format(r['pct-dislanes']))
+
+# Prints the top N rows of a hotspots table (instructions or functions) by accesses, gathers/scatters and partial-lane ratio.
+# Only rows with at least `min_count` SVE contiguous accesses are ranked by partial-lane ratio.
+def print_hotspots(df, what, label, N, min_count, total):
+  print(f"  Top {what} by accesses:")
+  for r in df.nlargest(N, 'accesses').to_dict('records'):
+    print("    {}: {}".format(label(r), format_hotspot(r, total)))
+
+  gs = df.assign(gs=df.gathers + df.scatters)
+  gs = gs[gs.gs > 0].nlargest(N, 'gs')
+  if len(gs) > 0:
+    print(f"  Top {what} by gathers/scatters:")
+    for r in gs.to_dict('records'):
+      print("    {}: {}".format(label(r), format_hotspot(r, total)))
+
+  partial = df[(df['sve-contig-dislanes'] > 0) & (df['sve-contiguous'] >= min_count)]
+  if len(partial) > 0:
+    print(f"  Top {what} by partial-lane ratio (with at least {min_count:,} SVE contiguous accesses):")
+    for r in partial.sort_values(['pct-dislanes', 'sve-contig-dislanes'], ascending=False).head(N).to_dict('records'):
+      print("    {}: {}".format(label(r), format_hotspot(r, total)))
+
+# Ranks the instructions and functions of each binary by memory accesses, gathers/scatters and partial-lane ratio
+def hotspots_count(binaries, namesmap, app, svewidth, N, min_count, export, fname):
+  hotspots = memory.hotspots_frame(binaries, namesmap, app, svewidth)
+
+  for b in binaries:
+    df = hotspots[hotspots.version == namesmap[b]]
+    functions = df.groupby('function', as_index=False)[memtrace.HOTSPOT_COUNTS].sum()
+    functions['pct-dislanes'] = memtrace.pct_dislanes(functions)
+
+    total = df.accesses.sum()
+    print("Version:", namesmap[b])
+    print("  Total memory accesses: {:,} ({:,} SVE) from {:,} instructions in {:,} functions".format(
+      total, df['sve-accesses'].sum(), len(df), df.function.nunique()))
+    if total == 0:
+      print()
+      continue
+
+    print_hotspots(df, 'instructions', lambda r: "0x{:x} {:<8} {}".format(r['pc'], r['opcode'], r['function']),
+                   N, min_count, total)
+    print_hotspots(functions, 'functions', lambda r: r['function'], N, min_count, total)
+    print()
+
+  if export:
+    with profiling.stage('export'):
+      pipeline.save(hotspots, fname)
+    print(f"Exported hotspots data to {fname}.pickle and {fname}.csv")
+
+def mem_count(binaries, export, N, app, names=None, timeline=None, gather_scatter=False, hotspots=False, min_count=0):
+  namesmap = {b: name for b,name in zip(binaries, names if names else binaries)}
+
+  # The timeline and hotspots tell all-lanes accesses from partial ones using the SVE width of the run
+  if timeline or hotspots:
+    runcfg = pipeline.read_config('.')
+    if runcfg is None:
+      sys.exit(1)
+    svewidth = runcfg['svewidth']
+
+  if timeline:
+    timeline_count(binaries, namesmap, app, timeline, svewidth, export, 'mem-timeline')
+
+  if gather_scatter:
+    gather_scatter_count(binaries, namesmap, app, export, 'mem-gather-scatter')
+
+  if hotspots:
+    hotspots_count(binaries, namesmap, app, svewidth, N, min_count, export, 'mem-hotspots')
+
   if export:
     fname = 'mem'
-    namesmap = {b: name for b,name in zip(binaries, names if names else binaries)}
     export_mem(binaries, namesmap, app, fname)
-  else:
+  elif not timeline and not gather_scatter and not hotspots:
     print("Refusing to run the legacy mem-count parser.")
     print("Use the Arm Research instrace tools, which are orders of magnitude faster.")
     print()
@@ -365,32 +337,34 @@ def mem_count(binaries, export, N, app, names=None):
 
 if __name__ == '__main__':
   args = parse_args()
+  profiling.start('armie-output-parser', args)
 
   if not os.path.isdir(args.results):
     print("Not a directory:", args.results)
     sys.exit(1)
 
-  binaries, bin_root, bin_versions = get_binaries(args.results)
+  binaries, bin_root, bin_versions = pipeline.get_binaries(args.results)
   if 'list' in args.mode:
     print("Binary name:", bin_root)
     print("  Versions:", ' '.join(bin_versions))
     sys.exit(0)
 
-  # TODO: unimplemented options
-  if args.isa != 'sve':
-    print("Warning: instruction set '" + args.isa + "' not implemented.")
+  if args.isa != 'sve' and 'mem-count' in args.mode:
+    print("Warning: --isa is ignored in mem-count mode.")
 
   os.chdir(args.results)
 
   assert len(args.mode) == 1
   if 'op-count' in args.mode:
-    sve_count(binaries, args.highlight, args.threshold, args.min_count, args.graph, args.export, args.n, bin_root, bin_versions)
+    if args.timeline or args.gather_scatter or args.hotspots:
+      print("Warning: --timeline, --gather-scatter and --hotspots are ignored in op-count mode.")
+    sve_count(binaries, args.highlight, args.threshold, args.min_count, args.graph, args.export, args.n, bin_root, bin_versions, args.isa)
   elif 'mem-count' in args.mode:
     if args.highlight:
       print("Warning: --highlight is ignored in mem-count mode.")
     if args.graph:
       print("Warning: --graph is not implemented in mem-count mode.")
-    mem_count(binaries, args.export, args.n, bin_root, bin_versions)
+    mem_count(binaries, args.export, args.n, bin_root, bin_versions, args.timeline, args.gather_scatter, args.hotspots, args.min_count)
 
 # TODO: Sample usage
 #
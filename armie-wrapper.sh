@@ -11,7 +11,7 @@ if [ "${BASH_VERSINFO[0]}" -lt 4 ]; then
 fi
 
 if [ $# -lt 2 ]; then
-    echo "Usage: armie-wrapper <sve-width> <binaries>"
+    echo "Usage: armie-wrapper [-a] [-i|-m] [-w] <sve-width> <binaries>"
     exit 1
 fi
 
@@ -63,10 +63,15 @@ function run_opcodes () {
     mv undecoded.txt "$dir/undecoded_${binary}.txt"
     mv a64-undecoded.txt "$dir/a64-undecoded_${binary}.txt"
 
-    awk '{print $3}' "${dir}/undecoded_${binary}.txt" | "${armie_dir}/bin64/enc2instr.py" > "${dir}/decoded_${binary}.txt"
+    # In watch mode, decoding and NEON counting are done by the watcher while the next emulation runs
+    if [ "$watch" = no ]; then
+        awk '{print $3}' "${dir}/undecoded_${binary}.txt" | "${armie_dir}/bin64/enc2instr.py" > "${dir}/decoded_${binary}.txt"
 
-    "${script_dir}/count-neon.py" "$binary" "${dir}/a64-undecoded_${binary}.txt" > "${dir}/a64-count_${binary}.txt"
-    mv disas.out "${dir}/disas_${binary}.out"
+        "${script_dir}/count-neon.py" -d "${dir}/disas_${binary}.out" "$binary" "${dir}/a64-undecoded_${binary}.txt" > "${dir}/a64-count_${binary}.txt"
+    fi
+
+    # Mark the artifacts as complete; the watcher reads the binary path from here
+    realpath "$binary" > "${dir}/.opcodes_${binary}.done"
 }
 
 function run_memtrace () {
@@ -89,6 +94,8 @@ function run_memtrace () {
 
     svememtrace="sve-${memtrace%.*.log}.log"
     mv "$svememtrace" "$dir/."
+
+    touch "${dir}/.memtrace_${binary}.done"
 }
 
 
@@ -100,8 +107,9 @@ echo "ArmIE is installed in: $armie_dir"
 inscount_only=no
 memtrace_only=no
 app_only=no
+watch=no
 
-while getopts ":aoim" opt; do
+while getopts ":aoimw" opt; do
     case "$opt" in
         o|i)
             inscount_only=yes
@@ -112,6 +120,9 @@ while getopts ":aoim" opt; do
         a)
             app_only=yes
             ;;
+        w)
+            watch=yes
+            ;;
         \?)
             echo "Invalid option: -$OPTARG"
             exit 7
@@ -153,6 +164,12 @@ echo "$prefix" > "$results/binaries.lst"
 echo "svewidth = $svewidth" >> "$results/run.cfg"
 echo "time = $ts" >> "$results/run.cfg"
 
+if [ "$watch" = yes ]; then
+    "$script_dir/watch-results.py" --armie-dir "$armie_dir" "$results" > "$results/watch.log" 2>&1 &
+    watch_pid=$!
+    echo "Post-processing in the background; see $results/watch.log"
+fi
+
 echo
 for b in "${binaries[@]}"; do
     echo -n "$(basename "$b"): "
@@ -173,10 +190,17 @@ for b in "${binaries[@]}"; do
     echo "Done."
 done
 
-# If we've collected a memory trace, process it using the instrace tools
-if [ "$inscount_only" = no ]; then
-    "$script_dir/run-instrace-tools.sh" "$results" "$svewidth"
-    "$script_dir/utils/clean-instrace-tools-output.sh" "$results"
+if [ "$watch" = yes ]; then
+    touch "$results/.complete"
+    echo "Waiting for post-processing to finish..."
+    wait "$watch_pid" || echo "Post-processing failed; see $results/watch.log"
+else
+    # If we've collected a memory trace, process it using the instrace tools
+    if [ "$inscount_only" = no ]; then
+        "$script_dir/run-instrace-tools.sh" "$results" "$svewidth"
+        "$script_dir/utils/clean-instrace-tools-output.sh" "$results"
+    fi
+    touch "$results/.complete"
 fi
 
 echo "All done."
@@ -1,85 +1,92 @@
 #!/usr/bin/env python3
 
-import re
+import argparse
 import subprocess as sp
-import sys
 
-from dataclasses import dataclass
+import numpy as np
 
-@dataclass
-class Instruction:
-  opcode: str
-  arguments: str
-  count: int = 0
-  is_vector: bool = False
-  is_q: bool = False
+from sve_analysis import a64, profiling
 
-# Runs objdump to disassemble the given binary
-def disassemble_binary(binary):
-  return sp.check_output(f"objdump -d -j .text {binary}".split(), universal_newlines=True).split('\n')
-
-# Returns a mapping address -> Instruction for the given disassembly code
-def parse_disassembly(disas):
-  code = {}
-
-  for line in disas:
-    if not re.match(r' {0,2}[0-9a-z]{6,}:', line):
-      continue
-
-    line    = line.strip()
-    parts   = re.split(r'\s+', line)
-    address   = parts[0][:-1]
-    arguments = ' '.join(parts[3:])
-    arguments = re.sub('//.*', '', arguments)
-    is_vector = True if re.match(r'v[0-9]{1,2}\.[0-9]{1,2}[a-z]', arguments) else False
-    is_q      = True if re.match(r'q[0-9]{1,2}', arguments) else False
-
-    code[address] = Instruction(opcode=parts[2], arguments=arguments, count=0, is_vector=is_vector, is_q=is_q)
+def parse_args():
+  parser = argparse.ArgumentParser()
 
-  return code
+  parser.add_argument('-d', '--disas', metavar='FILE',
+                      help='also save the objdump disassembly of the binary to %(metavar)s; this is not needed for counting')
 
-# Parses an oprecord trace and undoes the map from addresses to instruction
-def process_trace(code, trace):
-  total, outside_binary, vector, q = 0, 0, 0, 0
+  profiling.add_arguments(parser)
 
-  with open(trace, 'r') as f:
-    lines = f.readlines()
+  parser.add_argument('binary', help='the binary that was traced')
+  parser.add_argument('trace', help='the oprecord trace (a64-undecoded.txt)')
 
-  for line in lines:
-    count, address = line.strip().replace(' ', '').split(':')
-    address        = address[2:].lstrip('0')
-    count          = int(count)
+  return parser.parse_args()
 
-    total += count
-    if address in code:
-      instr = code[address]
-      instr.count += count
-
-      if instr.is_vector:
-        vector += count
-      elif instr.is_q:
-        q += count
-    else:
-      outside_binary += count
-
-  return total, vector, q, outside_binary
+# Runs objdump to disassemble the given binary
+def disassemble_binary(binary):
+  with profiling.stage('disassemble_binary') as m:
+    disas   = sp.check_output(f"objdump -d -j .text {binary}".split(), universal_newlines=True).split('\n')
+    m.lines = len(disas)
+  return disas
+
+# Returns the address -> class table for the instructions in the binary
+def classify_binary(binary):
+  with profiling.stage('classify_binary') as m:
+    m.add_files(binary)
+    addresses, classes, is_q = a64.class_table(binary)
+    m.lines = len(addresses)
+  return addresses, classes, is_q
+
+# Reads an oprecord trace into arrays of dynamic counts and instruction addresses
+def read_trace(trace):
+  with profiling.stage('read_trace') as m:
+    m.add_files(trace)
+    counts, addresses = a64.read_counts(trace)
+    m.lines = len(counts)
+  return counts, addresses
+
+# Joins an oprecord trace with the address -> class table of the binary.
+# Returns the total count, the count of each class, the count of Q register loads/stores and the count outside the binary.
+def process_trace(table, trace):
+  addresses, classes, is_q = table
+  counts, trace_addresses  = read_trace(trace)
+
+  with profiling.stage('process_trace') as m:
+    m.lines = len(counts)
+
+    # The table is sorted by address, so look up each traced address with a binary search
+    idx    = a64.lookup(addresses, trace_addresses)
+    inside = idx >= 0
+    idx, inside_counts = idx[inside], counts[inside]
+
+    by_class = np.zeros(len(a64.CLASS_NAMES), dtype=np.int64)
+    np.add.at(by_class, classes[idx], inside_counts)
+    q = int(inside_counts[is_q[idx]].sum())
+
+    total          = int(counts.sum())
+    outside_binary = total - int(inside_counts.sum())
+
+  return total, {name: int(c) for name, c in zip(a64.CLASS_NAMES, by_class)}, q, outside_binary
 
 
 def main():
-  if len(sys.argv) < 3 or '-h' in sys.argv or '--help' in sys.argv:
-    print("Usage: count-neon.py <binary> <oprecord-trace>")
-    sys.exit(1)
+  args = parse_args()
+  profiling.start('count-neon', args)
+
+  if args.disas:
+    disas = disassemble_binary(args.binary)
+    with open(args.disas, 'w') as f:
+      f.write("\n".join(disas))
 
-  disas = disassemble_binary(sys.argv[1])
-  with open("disas.out", 'w') as f:
-    f.write("\n".join(disas))
-  code = parse_disassembly(disas)
-  total, vector, q, outside_binary = process_trace(code, sys.argv[2])
+  table = classify_binary(args.binary)
+  total, by_class, q, outside_binary = process_trace(table, args.trace)
+  vector, fp, sve = by_class['simd'] - q, by_class['fp'], by_class['sve']
 
+  # The first lines are read by armie-output-parser.py, so keep their format
   print(f'Total instructions: {total:,}')
   print(f'Vector instructions (v only): {vector:,} ({vector/total*100:.2f}%)')
   print(f'Vector instructions (v and q): {(vector+q):,} ({(vector+q)/total*100:.2f}%)')
   print(f'Instructions outside binary: {outside_binary:,} ({outside_binary/total*100:.2f}%)')
+  print(f'Scalar FP instructions: {fp:,} ({fp/total*100:.2f}%)')
+  print(f'SVE instructions: {sve:,} ({sve/total*100:.2f}%)')
 
 if __name__ == '__main__':
   main()
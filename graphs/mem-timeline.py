@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import dataset, plots, profiling
+
+def parse_args():
+  parser = argparse.ArgumentParser()
+
+  parser.add_argument('-a', '--application', help='Plot only the given application')
+  parser.add_argument('--version', action='append', help='Plot only the given version; can be repeated')
+  parser.add_argument('-w', '--svewidth', type=int, action='append', help='Plot only the given SVE width; can be repeated')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('data', help='The data to plot, in CSV or DataFrame pickle format, or a Parquet dataset directory')
+
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  profiling.start('mem-timeline', args)
+
+  df = dataset.read_results(args.data, application=args.application, version=args.version, svewidth=args.svewidth,
+                            columns=['application', 'version', 'svewidth', 'window', 'window-size'] + list(plots.TIMELINE_METRICS.keys()))
+
+  applications = [args.application] if args.application else pd.unique(df['application'])
+
+  for a in applications:
+    with profiling.stage('plot'):
+      plots.mem_timeline(df, a)
+
+
+if __name__ == '__main__':
+  main()
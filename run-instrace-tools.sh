@@ -6,7 +6,7 @@ set -o pipefail
 script_dir="$(realpath "$(dirname "$(realpath "$0")")")"
 
 if [ $# -lt 1 ]; then
-    echo "Usage: run-instrace-tools <results> [<sve-width>"]
+    echo "Usage: run-instrace-tools <results> [<sve-width> [<binary>]]"
     exit 1
 fi
 
@@ -33,7 +33,14 @@ if [ ! -d "$results_dir" ] || [ ! -s "$results_dir/binaries.lst" ]; then
     exit 2
 fi
 
-for tool in merger/bin/merge analyzer/bin/analyze bundle/bin/bundle; do
+if [ $# -ge 3 ]; then
+    binaries=( "$3" )
+else
+    mapfile -t binaries < <(tail -n +2 "$results_dir/binaries.lst") # Skip the first line because that's the common prefix
+fi
+
+# The merger is optional: without it, the traces are merged using utils/memtrace-merge.py
+for tool in analyzer/bin/analyze bundle/bin/bundle; do
     if [ ! -x "$INSTRACE_TOOLS/sve-scripts/memtrace_$tool" ]; then
         echo "Cannot find '${tool##*/}' at: $INSTRACE_TOOLS/sve-scripts/memtrace_$tool."
         echo "Make sure the instrace-tools are built first."
@@ -47,8 +54,8 @@ done
 function run_merge () {
     local binary="$1" tool="$INSTRACE_TOOLS/sve-scripts/memtrace_merger/bin/merge"
 
-    if [ ! -x "$tool" ]; then
-        echo -n "Not available"
+    if [ ! -x "$tool" ] || [ "${BUILTIN_MERGE:-no}" = yes ]; then
+        "$script_dir/utils/memtrace-merge.py" -b "$binary" -o "merged-memtrace.$binary.log" > /dev/null
         return
     fi
 
@@ -81,7 +88,7 @@ function run_bundle () {
 # set -x
 cd "$results_dir" || exit
 
-while IFS= read -r binary; do
+for binary in "${binaries[@]}"; do
     echo -n "$binary: "
 
     echo -n "Merge... "
@@ -109,5 +116,5 @@ while IFS= read -r binary; do
     fi
 
     echo "Done."
-done < <(tail -n +2 "binaries.lst"); # Skip the first line because that's the common prefix
+done
 
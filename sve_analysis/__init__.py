@@ -0,0 +1,2 @@
+# Shared helpers for the SVE analysis scripts.
+# The scripts in utils/ and graphs/ add the repository root to sys.path to import this package.
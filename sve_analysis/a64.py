@@ -0,0 +1,169 @@
+# Classification of A64 instructions straight from the .text section of an ELF binary.
+#
+# A64 instructions are fixed-width 32-bit words, so the whole section can be read into a NumPy array
+# and classified with bit masks, without disassembling it.
+# Each instruction is tagged as one of:
+#   - scalar: general-purpose integer, branch, system and load/store instructions
+#   - simd:   Advanced SIMD (NEON) instructions operating on vectors, including structure loads/stores
+#             (LD1-LD4, ST1-ST4) and loads/stores of whole 128-bit Q registers
+#   - fp:     scalar floating-point and Advanced SIMD scalar instructions, and the remaining SIMD&FP loads/stores
+#   - sve:    SVE instructions
+# The encodings follow the top-level A64 decode table in the Arm Architecture Reference Manual.
+#
+# The dynamic counts of each instruction recorded by oprecord (a64-undecoded.txt) can also be joined with
+# the objdump disassembly of the binary to count each opcode, and other per-instruction data can be
+# joined with it in the same way to find the opcode and function of each instruction.
+
+import re
+import struct
+
+import numpy as np
+
+SCALAR, SIMD, FP, SVE = 0, 1, 2, 3
+CLASS_NAMES = ['scalar', 'simd', 'fp', 'sve']
+
+EM_AARCH64 = 183
+
+# Reads the .text section of a 64-bit little-endian AArch64 ELF binary.
+# Returns the address of the section and its contents as an array of instruction words.
+def read_text(path):
+  with open(path, 'rb') as f:
+    data = f.read()
+
+  if data[:4] != b'\x7fELF':
+    raise ValueError(f"{path}: not an ELF file")
+  if data[4] != 2 or data[5] != 1:
+    raise ValueError(f"{path}: only 64-bit little-endian ELF files are supported")
+  machine, = struct.unpack_from('<H', data, 0x12)
+  if machine != EM_AARCH64:
+    raise ValueError(f"{path}: not an AArch64 binary (e_machine = {machine})")
+
+  shoff,                    = struct.unpack_from('<Q', data, 0x28)
+  shentsize, shnum, shstrndx = struct.unpack_from('<HHH', data, 0x3A)
+
+  # Section headers: name, type, flags, addr, offset, size, link, info, addralign, entsize
+  sections = [struct.unpack_from('<IIQQQQIIQQ', data, shoff + i*shentsize) for i in range(shnum)]
+  strtab   = sections[shstrndx][4]
+
+  for name, _, _, addr, offset, size, *_ in sections:
+    start = strtab + name
+    if data[start:data.index(b'\0', start)] == b'.text':
+      return addr, np.frombuffer(data, dtype='<u4', count=size//4, offset=offset)
+
+  raise ValueError(f"{path}: no .text section")
+
+# Classifies an array of A64 instruction words.
+# Returns the class of each instruction and a mask of the loads/stores of whole Q registers.
+def classify(words):
+  words = np.asarray(words, dtype=np.uint32)
+
+  def match(mask, value):
+    return (words & np.uint32(mask)) == np.uint32(value)
+
+  # Top-level groups, from op0 = bits [28:25]
+  sve     = match(0x1E000000, 0x04000000) # 0010
+  ldst_v  = match(0x0E000000, 0x0C000000) # x1x0 with V (bit 26) set: SIMD&FP loads/stores
+  dp_simd = match(0x0E000000, 0x0E000000) # x111: data processing, scalar FP and Advanced SIMD
+
+  # Advanced SIMD load/store multiple and single structures
+  structs = match(0xBE000000, 0x0C000000)
+
+  # 128-bit register loads/stores: LDR/STR (size = 00, opc<1> = 1), LDP/STP and LDR literal (opc = 10)
+  is_q = ldst_v & (
+      (match(0x3E000000, 0x3C000000) & match(0xC0800000, 0x00800000))
+    | (match(0x3E000000, 0x2C000000) & match(0xC0000000, 0x80000000))
+    | (match(0x3F000000, 0x1C000000) & match(0xC0000000, 0x80000000)))
+
+  # Within data processing, bit 28 separates Advanced SIMD vector and crypto (clear)
+  # from scalar FP and Advanced SIMD scalar (set)
+  dp_scalar = match(0x10000000, 0x10000000)
+
+  classes = np.full(words.shape, SCALAR, dtype=np.uint8)
+  classes[ldst_v]               = FP
+  classes[structs | is_q]       = SIMD
+  classes[dp_simd & ~dp_scalar] = SIMD
+  classes[dp_simd & dp_scalar]  = FP
+  classes[sve]                  = SVE
+
+  return classes, is_q
+
+# Returns the address -> class table for the .text section of a binary, as arrays of addresses, classes and Q masks
+def class_table(path):
+  text_addr, words = read_text(path)
+  classes, is_q    = classify(words)
+  addresses        = text_addr + 4 * np.arange(len(words), dtype=np.uint64)
+
+  return addresses, classes, is_q
+
+# Reads an oprecord trace into arrays of dynamic counts and instruction addresses
+def read_counts(path):
+  with open(path, 'r') as f:
+    # Each line is "<count> : 0x<address>"
+    tokens = f.read().split()
+
+  counts    = np.array(tokens[0::3], dtype=np.int64)
+  addresses = np.array([int(a, 16) for a in tokens[2::3]], dtype=np.uint64)
+  return counts, addresses
+
+# Reads the instructions in the output of `objdump -d`.
+# Returns arrays of addresses, instruction words and opcodes, sorted by address.
+def read_disassembly(path):
+  with open(path, 'r') as f:
+    # Instruction lines are "<address>:\t<word> \t<opcode>\t<operands>"
+    lines = re.findall(r'^\s*([0-9a-f]+):\s+([0-9a-f]{8})\s+(\S+)', f.read(), re.MULTILINE)
+
+  addresses = np.array([int(a, 16) for a, _, _ in lines], dtype=np.uint64)
+  words     = np.array([int(w, 16) for _, w, _ in lines], dtype=np.uint32)
+  opcodes   = np.array([op for _, _, op in lines], dtype=object)
+
+  order = np.argsort(addresses, kind='stable')
+  return addresses[order], words[order], opcodes[order]
+
+# Reads the symbols in the output of `objdump -d`, which mark the start of each function.
+# Returns arrays of start addresses and names, sorted by address.
+def read_symbols(path):
+  with open(path, 'r') as f:
+    # Symbol lines are "<address> <<name>>:"
+    lines = re.findall(r'^([0-9a-f]+) <(.+)>:$', f.read(), re.MULTILINE)
+
+  addresses = np.array([int(a, 16) for a, _ in lines], dtype=np.uint64)
+  names     = np.array([name for _, name in lines], dtype=object)
+
+  order = np.argsort(addresses, kind='stable')
+  return addresses[order], names[order]
+
+# Finds the given addresses in an array of sorted addresses, e.g. from read_disassembly().
+# Returns the index of each one, or -1 where it is not found.
+# With `exact` false, returns the index of the last address at or before each one instead, e.g. to find its function.
+def lookup(sorted_addresses, addresses, exact=True):
+  addresses = np.asarray(addresses, dtype=np.uint64)
+  if len(sorted_addresses) == 0:
+    return np.full(len(addresses), -1)
+
+  if not exact:
+    return np.searchsorted(sorted_addresses, addresses, side='right') - 1
+
+  idx = np.minimum(np.searchsorted(sorted_addresses, addresses), len(sorted_addresses) - 1)
+  return np.where(sorted_addresses[idx] == addresses, idx, -1)
+
+# Counts the executions of each opcode in an oprecord trace, using the disassembly of the binary.
+# Returns arrays of opcodes, whether they are Advanced SIMD (NEON) instructions, and their counts,
+# and the count of the instructions outside the disassembly.
+def opcode_counts(disassembly, trace):
+  addresses, words, opcodes = disassembly
+  counts, trace_addresses   = trace
+
+  idx    = lookup(addresses, trace_addresses)
+  inside = idx >= 0
+  idx    = idx[inside]
+
+  # An opcode can be both, e.g. ldr of an X or a Q register, so count each (opcode, NEON) pair separately
+  names, op_ids = np.unique(opcodes, return_inverse=True)
+  neon          = classify(words)[0] == SIMD
+  keys          = 2 * op_ids[idx] + neon[idx]
+
+  totals = np.zeros(2 * len(names), dtype=np.int64)
+  np.add.at(totals, keys, counts[inside])
+
+  used = np.flatnonzero(totals)
+  return names[used // 2], (used % 2).astype(bool), totals[used], int(counts[~inside].sum())
@@ -0,0 +1,116 @@
+# Reading and writing result DataFrames.
+#
+# Results can be stored as a DataFrame pickle, a CSV file, or a Parquet dataset.
+# A dataset is a directory with one sub-directory per result type ({ops, mem-analyze, mem-bundle, mem-timeline, mem-gather-scatter, mem-hotspots}),
+# each partitioned by application and svewidth, e.g.:
+#
+#   merged_2019-07-29_15-05-42/ops/application=stream/svewidth=512/<part>.parquet
+#
+# Filters on the partition columns and on the version are pushed down to the Parquet reader,
+# so that only the matching partitions and columns are read from disk.
+
+import os
+import os.path
+import shutil
+
+import pandas as pd
+
+from sve_analysis import profiling
+
+PARTITION_COLS = ['application', 'svewidth']
+
+# Returns true if `path` points to a partitioned dataset rather than a single pickle or CSV file
+def is_dataset(path):
+  return os.path.isdir(path)
+
+def _as_list(values):
+  if values is None:
+    return None
+  if isinstance(values, (list, tuple, set)):
+    return list(values)
+  return [values]
+
+# Builds a list of Parquet filters, one for each constraint that was given
+def _filters(application, version, svewidth):
+  filters = []
+  if application is not None:
+    filters.append(('application', 'in', _as_list(application)))
+  if version is not None:
+    filters.append(('version', 'in', _as_list(version)))
+  if svewidth is not None:
+    filters.append(('svewidth', 'in', [int(w) for w in _as_list(svewidth)]))
+
+  return filters
+
+# Reads results from a pickle, a CSV file, or a dataset directory.
+# Only the rows matching all of `application`, `version` and `svewidth` are returned; each can be a value or a list.
+# For datasets, `columns` limits the columns read from disk.
+def read(path, application=None, version=None, svewidth=None, columns=None):
+  if is_dataset(path):
+    filters = _filters(application, version, svewidth)
+    df = pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters if filters else None)
+
+    # Partition columns are read back as categories
+    if 'application' in df.columns:
+      df['application'] = df.application.astype(str)
+    if 'svewidth' in df.columns:
+      df['svewidth'] = df.svewidth.astype(int)
+    return df
+
+  if path.endswith('.csv'):
+    df = pd.read_csv(path)
+  else:
+    df = pd.read_pickle(path)
+
+  if application is not None:
+    df = df[df.application.isin(_as_list(application))]
+  if version is not None:
+    df = df[df.version.isin(_as_list(version))]
+  if svewidth is not None:
+    df = df[pd.to_numeric(df.svewidth).isin([int(w) for w in _as_list(svewidth)])]
+  if columns is not None:
+    df = df[columns]
+
+  return df
+
+# Reads merged results as read() does, in a 'read' profiling stage, with the svewidth as numbers.
+# This is how the graph and analysis scripts load their inputs.
+def read_results(path, application=None, version=None, svewidth=None, columns=None):
+  with profiling.stage('read') as m:
+    m.add_files(path)
+    df      = read(path, application=application, version=version, svewidth=svewidth, columns=columns)
+    m.lines = len(df)
+  df['svewidth'] = pd.to_numeric(df.svewidth)
+  return df
+
+# Writes results to a single pickle or CSV file, depending on the extension of `path`
+def write(df, path):
+  if path.endswith('.csv'):
+    df.to_csv(path, index=False)
+  else:
+    df.to_pickle(path)
+
+# Writes `df` as the `type` results of the dataset at `root`.
+# If `append` is false, any existing results of the same type are replaced.
+def write_dataset(df, root, type, append=False):
+  path = os.path.join(root, type)
+
+  df = df.copy()
+  df['svewidth'] = pd.to_numeric(df.svewidth)
+
+  if append or not os.path.exists(path):
+    df.to_parquet(path, engine='pyarrow', partition_cols=PARTITION_COLS, index=False)
+    return
+
+  # Write next to the existing data first, so that a failed write doesn't lose it.
+  # Files left over by an earlier failed write would end up in the dataset, so remove them first.
+  tmp_path = path + '.tmp'
+  shutil.rmtree(tmp_path, ignore_errors=True)
+  df.to_parquet(tmp_path, engine='pyarrow', partition_cols=PARTITION_COLS, index=False)
+  shutil.rmtree(path)
+  os.rename(tmp_path, path)
+
+# Rewrites a dataset type directory in place; `path` is a directory as accepted by read()
+def rewrite_dataset(df, path):
+  root, type = os.path.split(os.path.normpath(path))
+  write_dataset(df, root, type)
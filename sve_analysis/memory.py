@@ -0,0 +1,140 @@
+# Memory analysis of each binary, from its ArmIE memory traces and the outputs of the instrace tools.
+#
+# The files of a binary are read from the current directory, which must be its results directory.
+# The memory traces are read with memtrace.binary_traces(), so a merged binary trace is used if there is one.
+# Each of the *_frame functions returns the results for all the binaries as a single DataFrame,
+# with the version and application columns.
+
+import os
+
+import pandas as pd
+
+from sve_analysis import a64, memtrace, profiling
+
+class MemTrace:
+  def __init__(self):
+    self.total_mem_ops  = 0
+    self.total_reads    = 0
+    self.total_gathers  = 0
+    self.read_sizes     = {}
+    self.total_writes   = 0
+    self.total_scatters = 0
+    self.write_sizes    = {}
+    self.gather_scatter = None
+    # TODO: maybe do something with locations
+
+  @classmethod
+  def for_binary(cls, binary):
+    mem = MemTrace()
+
+    traces = memtrace.binary_traces(binary, sve_only=True)
+    assert len(traces) == 1
+
+    # Operations are counted as the chunks go past, on their way to the gather/scatter grouping
+    def counted(chunks):
+      for chunk in chunks:
+        ops    = chunk[chunk.bundle != memtrace.BUNDLE_ELEMENT]
+        writes = ops.is_write != 0
+        assert ops.bundle[writes].isin([memtrace.BUNDLE_NONE, memtrace.BUNDLE_SCATTER]).all()
+        assert ops.bundle[~writes].isin([memtrace.BUNDLE_NONE, memtrace.BUNDLE_GATHER]).all()
+
+        mem.total_mem_ops  += len(ops)
+        mem.total_writes   += int(writes.sum())
+        mem.total_reads    += int((~writes).sum())
+        mem.total_scatters += int((ops.bundle == memtrace.BUNDLE_SCATTER).sum())
+        mem.total_gathers  += int((ops.bundle == memtrace.BUNDLE_GATHER).sum())
+        for sizes, counts in ((mem.write_sizes, ops['size'][writes]), (mem.read_sizes, ops['size'][~writes])):
+          for size, n in counts.value_counts().items():
+            sizes[size] = sizes.get(size, 0) + int(n)
+
+        m.lines += len(chunk)
+        yield chunk
+
+    with profiling.stage('read_memtrace') as m:
+      m.add_files(traces[0][0])
+      m.lines = 0
+      chunks  = memtrace.trace_chunks(traces, ['bundle', 'is_write', 'size', 'address'], sve_only=True, raw=True)
+      mem.gather_scatter = memtrace.gather_scatter(counted(chunks))
+
+    return mem
+
+
+# Reads the CSV output of an instrace tool (analyze or bundle) for each binary
+def instrace_frame(binaries, namesmap, app, tool):
+  dfs = []
+  for b in binaries:
+    with profiling.stage('read_instrace_csv') as m:
+      m.add_files('.'.join([tool, b, 'csv']))
+      df_b = pd.read_csv('.'.join([tool, b, 'csv']))
+      m.lines = len(df_b)
+    df_b['version'] = namesmap[b]
+    dfs.append(df_b)
+
+  df = pd.concat(dfs, ignore_index=True)
+  df['application'] = app
+  return df
+
+# Splits the SVE memory trace of each binary into windows of `window` accesses, with the access mix of each window.
+# `svewidth` is the SVE width of the run, from its run.cfg.
+def timeline_frame(binaries, namesmap, app, window, svewidth):
+  dfs = []
+  for b in binaries:
+    traces = memtrace.binary_traces(b, sve_only=True)
+    assert len(traces) == 1
+
+    with profiling.stage('timeline') as m:
+      m.add_files(traces[0][0])
+      chunks = memtrace.trace_chunks(traces, ['seq', 'bundle', 'is_write', 'size'], sve_only=True)
+      df_b   = memtrace.timeline(chunks, window, svewidth)
+      m.lines = int(df_b.accesses.sum() + df_b.elements.sum())
+
+    df_b['version'] = namesmap[b]
+    dfs.append(df_b)
+
+  df = pd.concat(dfs, ignore_index=True)
+  df['application'] = app
+  df['window-size'] = window
+  return df
+
+# Returns the gather/scatter summaries of a MemTrace for each binary
+def gather_scatter_frame(mems, namesmap, app):
+  df = pd.concat([mems[b].gather_scatter.assign(version=namesmap[b]) for b in mems], ignore_index=True)
+  df['application'] = app
+  return df
+
+# Counts the memory accesses of each instruction in the native and SVE memory traces of each binary.
+# Instructions are named after their opcode and function from the disassembly (disas_<binary>.out), if available.
+# `svewidth` is the SVE width of the run, from its run.cfg.
+def hotspots_frame(binaries, namesmap, app, svewidth):
+  dfs = []
+  for b in binaries:
+    traces = memtrace.binary_traces(b)
+    with profiling.stage('hotspots') as m:
+      m.add_files(*[p for p, _ in traces])
+      df      = memtrace.hotspots(memtrace.trace_chunks(traces, ['bundle', 'is_write', 'size', 'pc'], raw=True), svewidth)
+      m.lines = int(df.accesses.sum() + df.elements.sum())
+
+    df['opcode'], df['function'] = 'UNKNOWN', 'UNKNOWN'
+    disas_file = 'disas_'+b+'.out'
+    if os.path.exists(disas_file):
+      with profiling.stage('read_disassembly') as m:
+        m.add_files(disas_file)
+        addresses, _, opcodes = a64.read_disassembly(disas_file)
+        sym_addresses, names  = a64.read_symbols(disas_file)
+        m.lines = len(addresses)
+
+      # Instructions outside the disassembly, e.g. in shared libraries, stay unknown
+      idx    = a64.lookup(addresses, df.pc.values)
+      inside = idx >= 0
+      df.loc[inside, 'opcode'] = opcodes[idx[inside]]
+      sym = a64.lookup(sym_addresses, df.pc.values[inside], exact=False)
+      df.loc[inside, 'function'] = [names[i] if i >= 0 else 'UNKNOWN' for i in sym]
+    else:
+      print(f"Warning: {disas_file} not found; instructions will not be named.")
+
+    df['version'] = namesmap[b]
+    dfs.append(df)
+
+  df = pd.concat(dfs, ignore_index=True)
+  df['application'] = app
+  return df
@@ -0,0 +1,385 @@
+# Streaming analysis of ArmIE memory traces.
+#
+# Each line of a trace is a record of the form:
+#   <seq>, <tid>, <bundle>, <is_write>, <size>, <address>, <pc>
+# Gathers and scatters are recorded as a single operation record (bundle 1 for gathers, 3 for scatters),
+# followed by one element record (bundle 2) for each element accessed.
+# ArmIE sometimes outputs artifacts at the beginning and end of a trace, with size 0 or a negative tid.
+#
+# Traces can be much larger than memory, so they are read in chunks of records and aggregated as they go.
+#
+# The native memory trace (memtrace.<binary>*.log) and the SVE memory trace (sve-memtrace.<binary>*.log)
+# share the sequence numbers, so they can be merged into a single stream in program order.
+# Merged traces can be kept in a compact binary form: a flat array of RECORD_DTYPE records, with a .bin extension.
+#
+# The analyses take a stream of chunks, so they can run on the ArmIE traces, on a merged binary trace,
+# or on the output of merge_chunks() without writing the merged trace to disk; see trace_chunks().
+
+import glob
+import os.path
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['seq', 'tid', 'bundle', 'is_write', 'size', 'address', 'pc']
+
+BUNDLE_NONE, BUNDLE_GATHER, BUNDLE_ELEMENT, BUNDLE_SCATTER = 0, 1, 2, 3
+
+CHUNK_RECORDS = 1 << 20
+
+# Binary records also record whether they come from the SVE trace
+RECORD_DTYPE = np.dtype([('seq', '<i8'), ('tid', '<i4'), ('bundle', 'u1'), ('is_write', 'u1'), ('size', '<u4'),
+                         ('address', '<u8'), ('pc', '<u8'), ('sve', 'u1')])
+
+# Converts the addresses (or pcs) of a chunk read with `raw` to integers.
+# Addresses that are already integers, e.g. from binary traces, are returned as they are.
+def parse_addresses(values):
+  values = np.asarray(values)
+  if values.dtype.kind in 'iu':
+    return values.astype(np.uint64)
+  return np.fromiter((int(a, 0) for a in values), dtype=np.uint64, count=len(values))
+
+def _read_binary_chunks(path, columns, chunksize):
+  records = np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+  for start in range(0, len(records), chunksize):
+    part = records[start:start+chunksize]
+    yield pd.DataFrame({c: part[c] for c in columns})
+
+# Reads a trace in chunks of up to `chunksize` records, skipping artifacts unless `skip_artifacts` is false.
+# Only the given columns (and those needed to find artifacts) are parsed.
+# With `raw`, addresses are kept as they appear in the trace, as strings. Converting them is the slowest part of reading
+# a trace, so analyses that only need some of them read them raw and convert those with parse_addresses().
+# Binary traces (.bin) can also contain the `sve` column.
+def read_chunks(path, columns=COLUMNS, chunksize=CHUNK_RECORDS, skip_artifacts=True, raw=False):
+  usecols = [c for c in COLUMNS if c in columns or (skip_artifacts and c in ('tid', 'size'))]
+
+  if path.endswith('.bin'):
+    reader = _read_binary_chunks(path, usecols + (['sve'] if 'sve' in columns else []), chunksize)
+  else:
+    dtypes = {c: str if c in ('address', 'pc') else 'int64' for c in usecols}
+    reader = pd.read_csv(path, header=None, names=COLUMNS, usecols=usecols, skipinitialspace=True,
+                         dtype=dtypes, chunksize=chunksize)
+
+  for chunk in reader:
+    if skip_artifacts:
+      chunk = chunk[(chunk['size'] > 0) & (chunk.tid >= 0)]
+    chunk = chunk[list(columns)]
+    if not raw:
+      chunk = chunk.assign(**{c: parse_addresses(chunk[c].values) for c in ('address', 'pc') if c in chunk.columns})
+    yield chunk
+
+
+###### merging ######
+def _nonempty(chunks):
+  for chunk in chunks:
+    if len(chunk) > 0:
+      return chunk
+  return None
+
+# Tags the chunks of a trace with its `sve` flag, and with the largest sequence number up to each record as `order`.
+# Records are merged by `order` rather than `seq`, so that records out of sequence number order
+# (e.g. the artifacts at the end of a trace, when they are kept) stay after the records before them in the trace.
+def _tagged(chunks, sve):
+  high = None
+  for chunk in chunks:
+    if len(chunk) == 0:
+      continue
+    order = np.maximum.accumulate(chunk.seq.values)
+    if high is not None:
+      order = np.maximum(order, high)
+    high = order[-1]
+    yield chunk.assign(sve=sve, order=order)
+
+# Merges several traces into a single stream of chunks in sequence number order.
+# `sources` is a list of (path, is_sve) pairs; each trace must be in sequence number order, as written by ArmIE,
+# apart from artifacts, which are output after the records before them in their trace.
+# This is a k-way merge on chunks: at most one chunk per trace is buffered, and every record up to the
+# smallest last sequence number of the buffered chunks can be output, since no trace can have anything before it.
+# The chunks have an additional `sve` column, recording which trace each record comes from.
+def merge_chunks(sources, columns=COLUMNS, chunksize=CHUNK_RECORDS, skip_artifacts=True, raw=False):
+  columns = (['seq'] if 'seq' not in columns else []) + [c for c in columns if c != 'sve']
+  readers = [_tagged(read_chunks(p, columns, chunksize, skip_artifacts, raw), sve) for p, sve in sources]
+  buffers = [_nonempty(r) for r in readers]
+
+  while any(b is not None for b in buffers):
+    active = [i for i, b in enumerate(buffers) if b is not None]
+    limit  = min(buffers[i].order.iloc[-1] for i in active)
+
+    # The buffers that end at `limit` are output whole, so each step makes progress
+    parts = []
+    for i in active:
+      n = np.searchsorted(buffers[i].order.values, limit, side='right')
+      parts.append(buffers[i].iloc[:n])
+      buffers[i] = buffers[i].iloc[n:] if n < len(buffers[i]) else _nonempty(readers[i])
+
+    yield pd.concat(parts).sort_values('order', kind='mergesort', ignore_index=True).drop(columns='order')
+
+# Returns the sources to merge for a binary, in the current directory
+def binary_sources(binary):
+  return [(p, False) for p in sorted(glob.glob(f'memtrace.{binary}*.log'))] \
+       + [(p, True)  for p in sorted(glob.glob(f'sve-memtrace.{binary}*.log'))]
+
+# Returns the traces to read for a binary, in the current directory, as (path, is_sve) pairs.
+# A merged binary trace (merged-memtrace.<binary>.bin, from memtrace-merge.py -f binary) is read instead of the ArmIE
+# traces if there is one, as it is much faster to read; its is_sve is None, as it records the trace of each record.
+# With `sve_only`, only the SVE traces are returned.
+def binary_traces(binary, sve_only=False):
+  merged = f'merged-memtrace.{binary}.bin'
+  if os.path.exists(merged):
+    return [(merged, None)]
+  return [(p, sve) for p, sve in binary_sources(binary) if sve or not sve_only]
+
+# Reads a list of traces from binary_traces() as a single stream of chunks, with the `sve` column.
+# With `sve_only`, only the SVE records of merged traces are kept. `raw` is as for read_chunks().
+def trace_chunks(traces, columns, sve_only=False, chunksize=CHUNK_RECORDS, raw=False):
+  for path, sve in traces:
+    if sve is None:
+      for chunk in read_chunks(path, list(columns) + ['sve'], chunksize, raw=raw):
+        yield chunk[chunk.sve != 0] if sve_only else chunk
+    else:
+      for chunk in read_chunks(path, columns, chunksize, raw=raw):
+        yield chunk.assign(sve=int(sve))
+
+# Writes merged chunks as a text trace, in the same format as the ArmIE traces.
+# The chunks must have been read with `raw`, so that the addresses are written unchanged.
+def write_text(chunks, path):
+  with open(path, 'w') as f:
+    for chunk in chunks:
+      lines = chunk[COLUMNS[0]].astype(str)
+      for c in COLUMNS[1:]:
+        lines = lines + ', ' + chunk[c].astype(str)
+      f.write('\n'.join(lines) + '\n' if len(lines) > 0 else '')
+
+# Writes merged chunks as a binary trace
+def write_binary(chunks, path):
+  with open(path, 'wb') as f:
+    for chunk in chunks:
+      records = np.empty(len(chunk), dtype=RECORD_DTYPE)
+      for c in RECORD_DTYPE.names:
+        records[c] = chunk[c].values
+      records.tofile(f)
+
+
+###### timeline ######
+TIMELINE_COUNTS = ['accesses', 'reads', 'writes', 'gathers', 'scatters', 'elements',
+                   'contiguous', 'contig-alllanes', 'contig-dislanes', 'bytes-read', 'bytes-written']
+
+# Aggregates a chunk of records into per-window counts.
+# `ops_seen` is the number of operations in the trace before this chunk.
+# The bytes of a gather/scatter are those of its elements, as the size of its operation record is not the size accessed.
+def _timeline_chunk(chunk, window, ops_seen, vector_bytes):
+  is_op = chunk.bundle != BUNDLE_ELEMENT
+
+  # Element records belong to the window of the gather/scatter before them, which may be in the previous chunk
+  op_index = ops_seen - 1 + is_op.cumsum()
+  ops      = chunk[is_op]
+
+  reads      = ops.is_write == 0
+  contiguous = ops.bundle == BUNDLE_NONE
+  counts = pd.DataFrame({
+    'window':          op_index[is_op] // window,
+    'start':           ops.seq,
+    'accesses':        1,
+    'reads':           reads.astype('int64'),
+    'writes':          (~reads).astype('int64'),
+    'gathers':         (ops.bundle == BUNDLE_GATHER).astype('int64'),
+    'scatters':        (ops.bundle == BUNDLE_SCATTER).astype('int64'),
+    'elements':        0,
+    'contiguous':      contiguous.astype('int64'),
+    'contig-alllanes': (contiguous & (ops['size'] >= vector_bytes)).astype('int64'),
+    'contig-dislanes': (contiguous & (ops['size'] < vector_bytes)).astype('int64'),
+    'bytes-read':      ops['size'].where(contiguous & reads, 0),
+    'bytes-written':   ops['size'].where(contiguous & ~reads, 0),
+  })
+  element_index = op_index[~is_op]
+  elems         = chunk[~is_op][element_index >= 0]
+  elem_reads    = elems.is_write == 0
+  elements = pd.DataFrame({
+    'window':        element_index[element_index >= 0] // window,
+    'elements':      1,
+    'bytes-read':    elems['size'].where(elem_reads, 0),
+    'bytes-written': elems['size'].where(~elem_reads, 0),
+  })
+
+  return _combine([counts, elements])
+
+def _combine(frames):
+  agg = {c: 'sum' for c in TIMELINE_COUNTS}
+  agg['start'] = 'min'
+  return pd.concat(frames).groupby('window').agg(agg)
+
+# Splits a stream of chunks into windows of `window` memory operations and computes the access mix of each window.
+# The chunks must have the seq, bundle, is_write and size columns, and no artifacts.
+# The trace is read in a single pass, keeping at most one chunk and one partial window in memory.
+# Returns one row per window; `start` is the sequence number of the first operation in the window.
+def timeline(chunks, window, svewidth):
+  vector_bytes = int(svewidth) // 8
+  windows      = []
+  partial      = None
+  ops_seen     = 0
+
+  for chunk in chunks:
+    agg       = _timeline_chunk(chunk, window, ops_seen, vector_bytes)
+    ops_seen += int((chunk.bundle != BUNDLE_ELEMENT).sum())
+
+    # The first window of this chunk may have started in the previous one, and the last may continue in the next one
+    if partial is not None:
+      agg = _combine([partial.reset_index(), agg.reset_index()])
+    partial = agg.iloc[-1:]
+    windows.append(agg.iloc[:-1])
+
+  if partial is not None:
+    windows.append(partial)
+  if not windows:
+    return pd.DataFrame(columns=['window', 'start'] + TIMELINE_COUNTS)
+
+  df = pd.concat(windows).reset_index()
+  df[['start'] + TIMELINE_COUNTS] = df[['start'] + TIMELINE_COUNTS].fillna(0).astype('int64')
+  df['pct-reads']           = df.reads / df.accesses * 100
+  df['pct-gather-scatter']  = (df.gathers + df.scatters) / df.accesses * 100
+  df['pct-contig-alllanes'] = df['contig-alllanes'] / df.contiguous.where(df.contiguous > 0) * 100
+  df['mean-access-size']    = (df['bytes-read'] + df['bytes-written']) / df.accesses
+
+  return df[['window', 'start'] + TIMELINE_COUNTS
+            + ['pct-reads', 'pct-gather-scatter', 'pct-contig-alllanes', 'mean-access-size']]
+
+
+###### gather/scatter ######
+CACHE_LINE = 64
+
+GATHER_SCATTER_KEYS = ['type', 'elements', 'element-size', 'pattern', 'stride', 'lines']
+
+# Summarises the gathers and scatters of a chunk that starts with an operation record, one row per operation.
+# Each element record belongs to the operation before it. The stride pattern of an operation is:
+#  - 'single' if it accesses a single element,
+#  - 'unit-stride' if consecutive elements are adjacent in memory,
+#  - 'strided' if consecutive elements are a constant `stride` bytes apart (which may be 0 or negative),
+#  - 'irregular' otherwise.
+def _gather_scatter_ops(chunk, line_size):
+  bundle = chunk.bundle.values
+  is_op  = bundle != BUNDLE_ELEMENT
+  op_id  = np.cumsum(is_op) - 1
+
+  heads = pd.DataFrame({
+    'op':   op_id[(bundle == BUNDLE_GATHER) | (bundle == BUNDLE_SCATTER)],
+    'type': np.where(bundle[(bundle == BUNDLE_GATHER) | (bundle == BUNDLE_SCATTER)] == BUNDLE_GATHER, 'gather', 'scatter'),
+  })
+
+  el_op   = op_id[~is_op]
+  address = parse_addresses(chunk.address.values[~is_op]).astype('int64')
+  size    = chunk['size'].values[~is_op]
+  per_op  = pd.DataFrame({'op': el_op, 'size': size}).groupby('op').agg(
+              elements=('size', 'size'), bytes=('size', 'sum'), **{'element-size': ('size', 'first')})
+  per_op['lines'] = pd.DataFrame({'op': el_op, 'line': address // line_size}).drop_duplicates().groupby('op').size()
+
+  # Address differences between consecutive elements of the same operation
+  same    = el_op[1:] == el_op[:-1]
+  strides = pd.DataFrame({'op': el_op[1:][same], 'stride': np.diff(address)[same]}).groupby('op').stride.agg(['min', 'max'])
+  per_op  = per_op.join(strides)
+
+  constant = per_op['min'] == per_op['max']
+  per_op['pattern'] = np.select([per_op.elements == 1, constant & (per_op['min'] == per_op['element-size']), constant],
+                                ['single', 'unit-stride', 'strided'], 'irregular')
+  per_op['stride']  = per_op['min'].where(per_op.pattern == 'strided')
+
+  # Gathers and scatters with no element records access no memory, and are not counted
+  return heads.join(per_op, on='op', how='inner').drop(columns=['op', 'min', 'max'])
+
+def _combine_gather_scatter(frames):
+  return pd.concat(frames).groupby(GATHER_SCATTER_KEYS, as_index=False, dropna=False)[['operations', 'bytes']].sum()
+
+# Groups each gather and scatter in a stream of chunks with its element records.
+# The chunks must have the bundle, size and address columns, and no artifacts.
+# Only the addresses of the elements are used, so the chunks can be read with `raw` to only convert those.
+# Only the records from the last operation of each chunk are kept for the next one, since its elements may continue there.
+# Returns the number of operations for each combination of type, elements per operation, element size,
+# stride pattern (and stride for 'strided' operations) and distinct cache lines touched, with the total bytes they move.
+def gather_scatter(chunks, line_size=CACHE_LINE):
+  summary = pd.DataFrame(columns=GATHER_SCATTER_KEYS + ['operations', 'bytes'])
+  carry   = None
+
+  def summarise(records):
+    ops = _gather_scatter_ops(records, line_size).assign(operations=1)
+    return _combine_gather_scatter([summary, ops]) if len(ops) > 0 else summary
+
+  for chunk in chunks:
+    if carry is not None:
+      chunk = pd.concat([carry, chunk], ignore_index=True)
+
+    ops = np.flatnonzero(chunk.bundle.values != BUNDLE_ELEMENT)
+    if len(ops) == 0:
+      # Element records before the first operation are artifacts of the trace start
+      carry = chunk if carry is not None else None
+      continue
+
+    if ops[-1] > ops[0]:
+      summary = summarise(chunk.iloc[ops[0]:ops[-1]])
+    carry   = chunk.iloc[ops[-1]:]
+
+  if carry is not None:
+    summary = summarise(carry)
+
+  summary[['elements', 'element-size', 'lines', 'operations', 'bytes']] = \
+    summary[['elements', 'element-size', 'lines', 'operations', 'bytes']].astype('int64')
+  summary['cache-bytes'] = summary.lines * summary.operations * line_size
+  return summary.sort_values(GATHER_SCATTER_KEYS, ignore_index=True)
+
+
+###### hotspots ######
+HOTSPOT_COUNTS = ['accesses', 'sve-accesses', 'reads', 'writes', 'gathers', 'scatters', 'elements',
+                  'sve-contiguous', 'sve-contig-dislanes', 'bytes']
+
+# Aggregates a chunk of records into counts per instruction address (pc).
+# Element records have the pc of their gather/scatter, so they don't need to be grouped with it first.
+def _hotspots_chunk(chunk, vector_bytes):
+  is_op = chunk.bundle != BUNDLE_ELEMENT
+  ops   = chunk[is_op]
+  elems = chunk[~is_op]
+
+  reads      = ops.is_write == 0
+  contiguous = ops.bundle == BUNDLE_NONE
+  sve        = ops.sve != 0
+  counts = pd.DataFrame({
+    'pc':                  ops.pc,
+    'accesses':            1,
+    'sve-accesses':        sve.astype('int64'),
+    'reads':               reads.astype('int64'),
+    'writes':              (~reads).astype('int64'),
+    'gathers':             (ops.bundle == BUNDLE_GATHER).astype('int64'),
+    'scatters':            (ops.bundle == BUNDLE_SCATTER).astype('int64'),
+    'elements':            0,
+    'sve-contiguous':      (contiguous & sve).astype('int64'),
+    'sve-contig-dislanes': (contiguous & sve & (ops['size'] < vector_bytes)).astype('int64'),
+    'bytes':               ops['size'].where(contiguous, 0),
+  })
+  elements = pd.DataFrame({'pc': elems.pc, 'elements': 1, 'bytes': elems['size']})
+
+  return _combine_hotspots([counts, elements])
+
+def _combine_hotspots(frames):
+  return pd.concat(frames).groupby('pc', as_index=False)[HOTSPOT_COUNTS].sum()
+
+# Counts the memory accesses of each instruction in a stream of chunks, e.g. from trace_chunks().
+# The chunks must have the bundle, is_write, size, pc and sve columns, and no artifacts; they don't need to be in order.
+# The chunks can be read with `raw`: the records are grouped by pc as it appears in the trace,
+# and only the distinct pcs are converted to integers at the end.
+# Only the per-instruction totals are kept between chunks, so memory is bounded by the number of instructions
+# that access memory, not by the length of the traces.
+# Returns one row per pc, with the percentage of its SVE contiguous accesses that don't use all lanes.
+def hotspots(chunks, svewidth):
+  vector_bytes = int(svewidth) // 8
+  totals       = pd.DataFrame(columns=['pc'] + HOTSPOT_COUNTS)
+
+  for chunk in chunks:
+    agg    = _hotspots_chunk(chunk, vector_bytes)
+    totals = _combine_hotspots([totals, agg]) if len(totals) > 0 else agg
+
+  # The traces may write the same pc differently, so group again once they are integers
+  totals['pc'] = parse_addresses(totals.pc.values)
+  totals = _combine_hotspots([totals]).astype({c: 'int64' for c in HOTSPOT_COUNTS}).astype({'pc': 'uint64'})
+  totals['pct-dislanes'] = pct_dislanes(totals)
+  return totals.sort_values('accesses', ascending=False, ignore_index=True)
+
+# Returns the percentage of SVE contiguous accesses that don't use all lanes, from hotspot counts
+def pct_dislanes(df):
+  return df['sve-contig-dislanes'] / df['sve-contiguous'].where(df['sve-contiguous'] > 0) * 100
@@ -0,0 +1,184 @@
+# Counts of the SVE, A64 and NEON opcodes executed by each binary, from the outputs of the ArmIE clients.
+#
+# The files of a binary are read from the current directory, which must be its results directory.
+
+import os
+import re
+
+from sve_analysis import a64, profiling
+
+class Ops:
+  def __init__(self):
+    self.isa         = 'sve'
+    self.opcodes     = {} # The opcodes of the instruction set(s) in `isa`
+    self.opcounts    = None
+    self.top_ops     = None
+    self.top_counts  = None
+    self.total_ops   = 0
+    self.unique_ops  = 0
+
+    self.sve_opcodes = {}
+    self.total_sve   = 0
+
+    self.a64_opcodes = {} # (opcode, is_neon) -> count
+    self.total_a64   = 0
+    self.min_a64     = 0 # Legacy
+    self.total_neon  = 0
+
+  # Parses decoded.txt, undecoded.txt, and a64-count.tx (if available) to obtain instruction counts.
+  # With `isa` a64 or both, also counts A64 opcodes from a64-undecoded.txt and disas.out.
+  @classmethod
+  def for_binary(cls, binary, isa='sve'):
+    ops     = Ops()
+    ops.isa = isa
+
+    undecoded_file = 'undecoded_'+binary+'.txt'
+    if os.path.exists(undecoded_file):
+      # Parse decoded.txt to map instruction words to ops
+      inst_to_op = {}
+      with profiling.stage('read_decoded') as m, open('decoded_'+binary+'.txt', 'r') as decoded:
+        m.add_files('decoded_'+binary+'.txt')
+        nlines = 0
+        for line in decoded:
+          parts            = re.split(r'\s+', line.strip())
+          inst, op         = parts[0], parts[2]
+          inst_to_op[inst] = op
+          nlines          += 1
+        m.lines = nlines
+
+      # Parse undecoded.txt to count insutrctions
+      with profiling.stage('read_undecoded') as m, open('undecoded_'+binary+'.txt', 'r') as undecoded:
+        m.add_files('undecoded_'+binary+'.txt')
+        nlines = 0
+        for line in undecoded:
+          count, inst = line.strip().replace(' ', '').split(':')
+          count       = int(count)
+          op          = inst_to_op[inst]
+
+          ops.sve_opcodes[op]  = ops.sve_opcodes.get(op, 0) + count
+          ops.total_sve       += count
+          nlines              += 1
+        m.lines = nlines
+
+    a64_count_file = 'a64-count_'+binary+'.txt'
+    if isa != 'sve' and ops.read_a64_opcodes(binary):
+      pass # The A64 and NEON totals are exact from the opcode counts
+    elif os.path.exists(a64_count_file):
+      # Get the total number of scalar A64 and NEON instructions from a64-count, if available
+      with profiling.stage('read_a64_count') as m, open(a64_count_file, 'r') as out:
+        m.add_files(a64_count_file)
+        nlines = 0
+        for line in out:
+          if line.startswith('Total instructions:'):
+            ops.total_a64 = int(line.split(' ')[-1].replace(',', ''))
+          elif line.startswith('Vector instructions (v and q):'):
+            ops.total_neon = int(line.split(' ')[-2].replace(',', ''))
+          nlines += 1
+        m.lines = nlines
+    else:
+      # Get the approximate total number of A64 instructions from the opcodes client
+      with profiling.stage('read_opcodes') as m, open('opcodes_'+binary+'.out', 'r') as out:
+        m.add_files('opcodes_'+binary+'.out')
+        lines   = out.read().splitlines()
+        m.lines = len(lines)
+        start = lines.index('Opcode execution counts in AArch64 mode:')
+        end   = [idx for idx,s in enumerate(lines) if 'unique emulated instructions written to undecoded.txt' in s][0]
+        lines = lines[start+1:end]
+
+        ops.min_a64 = int(lines[0].strip().split(' ')[0])
+        for line in lines:
+          parts = re.split(r'\s+', line.strip())
+          count, op = int(parts[0]), parts[2]
+
+          ops.total_a64 += count
+
+    # A64 opcodes are prefixed when they are shown with SVE opcodes, and NEON opcodes always are
+    if isa in ('sve', 'both'):
+      ops.opcodes.update(ops.sve_opcodes)
+    if isa in ('a64', 'both'):
+      for (op, is_neon), count in ops.a64_opcodes.items():
+        name = ('neon:' if is_neon else 'a64:' if isa == 'both' else '') + op
+        ops.opcodes[name] = count
+
+    # Make an ordered inverse mapping (from counts to ops), so that it's easy to get top N
+    if len(ops.opcodes) > 0:
+      ops.top_ops, ops.top_counts = zip(*sorted(ops.opcodes.items(), key=lambda x: x[1], reverse=True))
+    else:
+      ops.top_ops, ops.top_counts = (), ()
+    ops.total_ops  = sum(ops.top_counts)
+    ops.unique_ops = len(ops.top_counts)
+
+    return ops
+
+  # Joins the per-address counts in a64-undecoded.txt with the disassembly in disas.out to count each A64 opcode.
+  # The counts are exact, so they replace the A64 and NEON totals from a64-count.txt or the opcodes client.
+  # Returns false if the files are not available.
+  def read_a64_opcodes(self, binary):
+    trace_file, disas_file = 'a64-undecoded_'+binary+'.txt', 'disas_'+binary+'.out'
+    if not os.path.exists(trace_file) or not os.path.exists(disas_file):
+      print(f"Warning: cannot count A64 opcodes for {binary} without {trace_file} and {disas_file}.")
+      return False
+
+    with profiling.stage('read_a64_opcodes') as m:
+      m.add_files(trace_file, disas_file)
+      trace       = a64.read_counts(trace_file)
+      disassembly = a64.read_disassembly(disas_file)
+      m.lines     = len(trace[0]) + len(disassembly[0])
+
+    with profiling.stage('join_a64_opcodes') as m:
+      opcodes, is_neon, counts, outside = a64.opcode_counts(disassembly, trace)
+      m.lines = len(trace[0])
+
+    self.a64_opcodes = {(op, bool(n)): int(c) for op, n, c in zip(opcodes, is_neon, counts)}
+    if outside > 0:
+      # Instructions outside the .text section of the binary, e.g. in shared libraries, cannot be decoded
+      self.a64_opcodes[('UNKNOWN', False)] = outside
+
+    self.total_a64  = sum(self.a64_opcodes.values())
+    self.min_a64    = 0
+    self.total_neon = sum(c for (_, is_neon), c in self.a64_opcodes.items() if is_neon)
+    return True
+
+  def get_nth_most_used(self, n):
+    return self.top_ops[n-1], self.top_counts[n-1]
+
+  def get_total(self):
+    return self.total_ops
+
+  def get_sve_total(self):
+    return self.total_sve
+
+  def get_unique_ops_count(self):
+    return self.unique_ops
+
+  def get_op_count(self, op):
+    return self.opcodes.get(op, 0)
+
+  def get_a64_count(self):
+    return self.total_a64, self.min_a64
+
+  def get_neon_count(self):
+    return self.total_neon
+
+  def get_scalar_count(self):
+    return self.total_a64 - self.total_neon
+
+
+# Returns the SVE opcodes, and the A64 and NEON instructions, of each binary as a DataFrame.
+# The isa column is 'sve', 'a64' or 'neon'. If the A64 opcodes were counted, each of them is included,
+# otherwise only the A64 and NEON totals are, as the 'A64' and 'NEON' ops.
+def to_frame(binaries, opsmap, namesmap, app):
+  import pandas as pd
+
+  data = []
+  for b in binaries:
+    ops  = opsmap[b]
+    row  = {'application': app, 'version': namesmap[b]}
+    data += [{**row, 'op': op, 'isa': 'sve', 'count': count} for op, count in ops.sve_opcodes.items()]
+    if ops.a64_opcodes:
+      data += [{**row, 'op': op, 'isa': 'neon' if is_neon else 'a64', 'count': count} for (op, is_neon), count in ops.a64_opcodes.items()]
+    else:
+      data += [{**row, 'op': 'A64', 'isa': 'a64', 'count': ops.get_scalar_count()},
+               {**row, 'op': 'NEON', 'isa': 'neon', 'count': ops.get_neon_count()}]
+
+  return pd.DataFrame(data, columns=['application', 'version', 'op', 'isa', 'count'])
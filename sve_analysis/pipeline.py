@@ -0,0 +1,227 @@
+# An in-memory pipeline over the analysis stages.
+#
+# The command line tools pass results to each other through files: armie-output-parser.py exports each results
+# directory, result-merge.py merges the exports, fix-neon.py and update-op-type.py rewrite them, and the graph
+# scripts read them back. This module runs the same stages in a single process, passing DataFrames between them;
+# files are only written by export().
+#
+# Results are passed around as a dict from result type (see TYPES) to DataFrame, e.g.:
+#
+#   from sve_analysis import pipeline
+#
+#   results = pipeline.merge(pipeline.parse(r, instrace=True) for r in ['results_128', 'results_512'])
+#   pipeline.prepare(results)
+#   pipeline.plot(results)
+#   pipeline.export(results, 'merged', format='parquet')
+#
+# summary() runs all of these stages for a campaign of results directories.
+
+import os
+import re
+
+from contextlib import contextmanager
+
+import pandas as pd
+
+from sve_analysis import dataset, memory, opcodes, plots, postprocess, profiling
+
+TYPES = ['ops', 'mem-analyze', 'mem-bundle', 'mem-timeline', 'mem-gather-scatter', 'mem-hotspots']
+
+# Gets a list of binaries for which results have been collected in a given directory
+# Assumes that the wrapper script has generated binaries.lst
+# Retuns 1) the actual file names, 2) the patters used to invoke the wrapper script, 3) the readable name of each version
+def get_binaries(results):
+  with open('/'.join((results,'binaries.lst'))) as f:
+    root     = f.readlines(1)[0].strip()
+    binaries = [b.strip() for b in f.readlines()]
+    versions = [b.replace(root, '')[1:] for b in binaries]
+
+  return binaries, root, versions
+
+# Reads the run configuration from a results directory
+def read_config(result):
+  cfg_path = os.path.join(result, 'run.cfg')
+
+  if not os.path.exists(cfg_path):
+    print(result + ':', "Could not read configuration from run.cfg")
+    return None
+
+  cfg     = {}
+  options = ['svewidth', 'time']
+  with open(cfg_path, 'r') as f:
+    for line in f:
+      for opt in options:
+        if opt in line:
+          cfg[opt] = re.split(r'[=\s]+', line)[1]
+          break
+
+  # Change the name of some keys
+  cfg['timestamp'] = cfg.pop('time', None)
+
+  return cfg
+
+# Runs the enclosed code in a results directory, as the parsers read the files of each binary from the current directory.
+# This changes the working directory of the whole process, so results directories must not be parsed in parallel threads.
+@contextmanager
+def in_directory(path):
+  cwd = os.getcwd()
+  os.chdir(path)
+  try:
+    yield
+  finally:
+    os.chdir(cwd)
+
+
+###### stages ######
+# Parses a results directory, as armie-output-parser.py --export does, and returns its results.
+# The ops results are always parsed, with the A64 opcodes if `isa` is a64 or both; the others are optional:
+#  - instrace:       the outputs of the instrace tools (mem-analyze, mem-bundle)
+#  - timeline:       the memory access timeline, with windows of `timeline` accesses (mem-timeline)
+#  - gather_scatter: the gather/scatter element accounting (mem-gather-scatter)
+#  - hotspots:       the per-instruction memory accesses (mem-hotspots)
+# The svewidth and timestamp of the run are added to all the results, as result-merge.py does.
+def parse(result, isa='sve', instrace=False, timeline=None, gather_scatter=False, hotspots=False):
+  binaries, app, versions = get_binaries(result)
+  namesmap = dict(zip(binaries, versions))
+  runcfg   = read_config(result)
+  results  = {}
+
+  if (timeline or hotspots) and runcfg is None:
+    raise FileNotFoundError(os.path.join(result, 'run.cfg'))
+
+  with in_directory(result):
+    opsmap = {b: opcodes.Ops.for_binary(b, isa) for b in binaries}
+    results['ops'] = opcodes.to_frame(binaries, opsmap, namesmap, app)
+
+    if instrace:
+      results['mem-analyze'] = memory.instrace_frame(binaries, namesmap, app, 'analyze')
+      results['mem-bundle']  = memory.instrace_frame(binaries, namesmap, app, 'bundle')
+    if timeline:
+      results['mem-timeline'] = memory.timeline_frame(binaries, namesmap, app, timeline, runcfg['svewidth'])
+    if gather_scatter:
+      mems = {b: memory.MemTrace.for_binary(b) for b in binaries}
+      results['mem-gather-scatter'] = memory.gather_scatter_frame(mems, namesmap, app)
+    if hotspots:
+      results['mem-hotspots'] = memory.hotspots_frame(binaries, namesmap, app, runcfg['svewidth'])
+
+  if runcfg is not None:
+    for df in results.values():
+      df['svewidth']  = runcfg['svewidth']
+      df['timestamp'] = runcfg['timestamp']
+
+  return results
+
+# Reads the exported results of a type from a results directory, with the svewidth and timestamp of the run.
+# Returns None if the results have not been exported.
+def read_exported(result, type):
+  pickle_path = os.path.join(result, type + '.pickle')
+  csv_path    = os.path.join(result, type + '.csv')
+
+  with profiling.stage('read_df') as m:
+    if os.path.exists(pickle_path):
+      m.add_files(pickle_path)
+      df = pd.read_pickle(pickle_path)
+    elif os.path.exists(csv_path):
+      m.add_files(csv_path)
+      df = pd.read_csv(csv_path)
+    else:
+      print(f"{result}: Could not find either {type}.pickle or {type}.csv")
+      return None
+    m.lines = len(df)
+
+  runcfg = read_config(result)
+  if runcfg is None:
+    return None
+
+  df['svewidth']  = runcfg['svewidth']
+  df['timestamp'] = runcfg['timestamp']
+
+  return df
+
+# Reads all the exported results of a results directory, for directories that have already been exported
+def load(result, types=TYPES):
+  results = {type: read_exported(result, type) for type in types}
+  return {type: df for type, df in results.items() if df is not None}
+
+# Concatenates DataFrames of the same type, skipping missing ones.
+# The columns of the first DataFrame come first, followed by any new ones from the others.
+def concat(dfs):
+  dfs = [df for df in dfs if df is not None]
+  if not dfs:
+    return None
+
+  columns = list(dfs[0].columns)
+  for df in dfs[1:]:
+    columns += [c for c in df.columns if c not in columns]
+
+  with profiling.stage('concat') as m:
+    merged  = pd.concat(dfs, ignore_index=True)[columns]
+    m.lines = len(merged)
+  return merged
+
+# Merges the results of several results directories, as returned by parse() or load()
+def merge(results):
+  dfs = {}
+  for r in results:
+    for type, df in r.items():
+      dfs.setdefault(type, []).append(df)
+  return {type: concat(dfs[type]) for type in TYPES if type in dfs}
+
+# Prepares merged results for plotting, as fix-neon.py and update-op-type.py do. The results are modified in place.
+# All the types get the same fixes, so they are only printed for the first one.
+def prepare(results):
+  for i, df in enumerate(results.values()):
+    with profiling.stage('fix') as m:
+      m.lines = len(df)
+      postprocess.fix_versions(df, verbose=(i == 0))
+
+  if 'ops' in results:
+    with profiling.stage('categorise') as m:
+      m.lines = len(results['ops'])
+      postprocess.categorise(results['ops'])
+
+  return results
+
+# Plots each application in the results, as the scripts in graphs/ do
+def plot(results, applications=None):
+  plotters = {'ops': plots.ops, 'mem-bundle': plots.mem_bundle, 'mem-timeline': plots.mem_timeline}
+
+  for type, plotter in plotters.items():
+    if type not in results:
+      continue
+
+    df = results[type].copy()
+    df['svewidth'] = pd.to_numeric(df.svewidth)
+    for a in applications if applications else pd.unique(df.application):
+      with profiling.stage('plot'):
+        plotter(df, a)
+
+# Saves results to a pickle and a CSV file
+def save(df, fname):
+  df.to_pickle(fname + '.pickle')
+  df.to_csv(fname + '.csv', index=False)
+
+# Writes results to the directory `root`: a pickle and CSV file per type, or a Parquet dataset, as result-merge.py does.
+# Results already in a Parquet dataset are kept.
+def export(results, root, format='pickle'):
+  os.makedirs(root, exist_ok=True)
+  for type, df in results.items():
+    with profiling.stage('export'):
+      if format == 'parquet':
+        dataset.write_dataset(df, root, type, append=True)
+      else:
+        save(df, os.path.join(root, type))
+    print("Exported", type, "to", os.path.join(root, type))
+
+# Runs the whole pipeline over a campaign of results directories in a single process:
+# parses each directory, merges and prepares the results, and optionally plots and exports them.
+# The keyword arguments are passed to parse(). Returns the merged results.
+def summary(result_dirs, plot_results=False, export_root=None, format='pickle', **kwargs):
+  results = prepare(merge(parse(r, **kwargs) for r in result_dirs))
+
+  if plot_results:
+    plot(results)
+  if export_root:
+    export(results, export_root, format)
+
+  return results
@@ -0,0 +1,112 @@
+# Plots of merged results, as drawn by the scripts in graphs/.
+#
+# Each function plots a single application from a DataFrame of results, and saves the plot in the current directory.
+# The plotting libraries are only imported when a plot is drawn.
+
+import pandas as pd
+
+# The per-window percentages of the memory access timeline to plot, and their labels
+TIMELINE_METRICS = {
+  'pct-contig-alllanes': 'All-lanes contiguous',
+  'pct-gather-scatter':  'Gather/scatter',
+  'pct-reads':           'Reads',
+}
+
+def _seaborn():
+  import seaborn as sea
+  sea.set(style='whitegrid')
+  sea.set_palette(sea.color_palette('colorblind', 8))
+  return sea
+
+# Plots the op counts of application `appname` by op group, from ops results with the optype column
+def ops(results, appname):
+  import altair as alt
+
+  appdata = results[results.application == appname]
+  if len(appdata) == 0:
+    print(f'No data to plot for {appname}.')
+    return
+
+  if appdata[appdata.svewidth == 0].groupby('version').sum()['count'].max() >= 1e9:
+    scale = 'billion'
+    appdata.loc[:, 'count'] /= 1e9
+  else:
+    scale = 'million'
+    appdata.loc[:, 'count'] /= 1e6
+
+  fname = f'opcount-{appname}-all-clustered-stacked-group.png'
+
+  alt.Chart(appdata).mark_bar().encode(x=alt.X('version', title='', axis=alt.Axis(labelAngle=-30)),
+                                   y=alt.Y('sum(count)', title=f'Dynamic execution count ({scale} instructions)'),
+                                   column='svewidth',
+                                   color=alt.Color('optype', title='Op Group', scale=alt.Scale(scheme='set2')))\
+                                .configure(background='white')\
+                                .configure_title(anchor='middle', fontSize=14)\
+                                .properties(title=appname)\
+                                .save(fname, scale_factor='2.0')
+
+  print(f'Saved plot for {appname} in {fname}.')
+
+# Plots histograms of the active SVE lanes of application `appname`, from mem-bundle results
+def mem_bundle(results, appname):
+  import matplotlib.pyplot as plt
+  sea = _seaborn()
+
+  appdata = results[results.application == appname]
+  if len(appdata) == 0:
+    print(f'No data to plot for {appname}.')
+    return
+
+  # The data has an entry for each active vector width
+  # We split it into bins and plot a histogram
+  bins       = [0]+list(range(127,1152,128))
+  bin_labels = ['0-127'] + [f'{bins[i]+1}-{bins[i+1]}' for i in range(1, len(bins)-2)] + ['1024']
+  binned      = appdata.groupby(['version', 'svewidth',pd.cut(appdata['active-bits'], bins=bins, labels=bin_labels)]).sum()
+
+  hist = pd.DataFrame(binned).drop(columns='active-bits', errors='ignore').reset_index()
+  hist['pct-accesses'].fillna(0, inplace=True)
+
+  g = sea.FacetGrid(hist, row='version', col='svewidth', margin_titles=True)\
+            .map(sea.barplot, "active-bits", "pct-accesses")\
+            .set_axis_labels("Active bits", "Percentage of operations")
+
+  _, labels = plt.xticks()
+  g.set_xticklabels(labels, rotation=90)
+  g.set(ylim=(0, 100))
+
+  g.fig.suptitle(appname, size='xx-large', y=0.99)
+  plt.tight_layout()
+  plt.subplots_adjust(top=0.9)
+
+  fname = f'memtrace-bundle-facet-{appname}.png'
+  plt.savefig(fname)
+  print(f'Saved plot for {appname} in {fname}.')
+
+# Plots the memory access mix over the run of application `appname`, from mem-timeline results
+def mem_timeline(results, appname):
+  import matplotlib.pyplot as plt
+  sea = _seaborn()
+
+  appdata = results[results.application == appname]
+  if len(appdata) == 0:
+    print(f'No data to plot for {appname}.')
+    return
+
+  # One line per metric, with the windows of each run on the x axis
+  lines = appdata.melt(id_vars=['version', 'svewidth', 'window'], value_vars=list(TIMELINE_METRICS.keys()),
+                       var_name='metric', value_name='pct')
+  lines['metric'] = lines.metric.map(TIMELINE_METRICS)
+
+  g = sea.relplot(data=lines, x='window', y='pct', hue='metric', row='version', col='svewidth',
+                  kind='line', height=2.5, aspect=2, facet_kws={'margin_titles': True})\
+         .set_axis_labels(f"Window ({appdata['window-size'].iloc[0]:,} accesses)", "Percentage of accesses")
+  g.set(ylim=(0, 100))
+  g._legend.set_title('')
+
+  g.fig.suptitle(appname, size='xx-large', y=0.99)
+  plt.tight_layout()
+  plt.subplots_adjust(top=0.9)
+
+  fname = f'memtrace-timeline-{appname}.png'
+  plt.savefig(fname)
+  print(f'Saved plot for {appname} in {fname}.')
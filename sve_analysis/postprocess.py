@@ -0,0 +1,65 @@
+# Post-processing of merged results, before they are plotted.
+#
+# These are the steps of fix-neon.py and update-op-type.py, on DataFrames in memory.
+
+import pandas as pd
+
+# Replaces the names of all versions of an app with just the basename
+def rename_versions(df, app, verbose=True):
+  variations = [a for a in df.application.unique() if a.startswith(f'{app}-')]
+  if verbose:
+    print("Renaming", variations, f"to '{app}'")
+  df.loc[df.application.str.startswith(f'{app}-'), 'application'] = app
+
+# Sets a bogus SVE width for scalar results to make plotting easier
+def fix_novec(df, verbose=True):
+  novec_svewidth = 0
+  if verbose:
+    print(f"novec: Setting svewidth = {novec_svewidth}")
+  df.loc[df.application.str.endswith(f'-novec'), 'svewidth'] = novec_svewidth
+
+# Sets a bogus SVE width for NEON results to make plotting easier
+def fix_neon(df, verbose=True):
+  neon_svewidth = 1
+  if verbose:
+    print(f"neon: Setting svewidth = {neon_svewidth}")
+  df.loc[df.application.str.endswith(f'-neon'), 'svewidth'] = neon_svewidth
+
+# Prepares the NEON and no-vec results for plotting, and gives all the variations of an app (<app>-sve,
+# <app>-neon, <app>-novec) the same application name. `df` is modified in place.
+# With `verbose`, each change is printed.
+def fix_versions(df, verbose=True):
+  # The svewidth is read from run.cfg as a string
+  df['svewidth'] = pd.to_numeric(df.svewidth)
+  fix_novec(df, verbose)
+  fix_neon(df, verbose)
+
+  apps = [a.replace('-sve', '') for a in df.application.unique() if a.endswith('-sve')]
+  for app in apps:
+    rename_versions(df, app, verbose)
+
+def get_op_category(op):
+  catmap = {
+    'arithmetic': ['fmla','fmul','fsub','fcmlt','fsqrt','fcmgt','fmls','fmad','cmpne','and','fabs','addvl','fadd','cntp','cntw','fnmsb','fcvtzs','fcmeq','frinta','orr','cmpeq','fnmls','fneg','fcmge','fmsb','incb','fdiv','incd','fdivr','fcmle','cmpgt','add','sub','mul','faddv','fcvt','scvtf','fminnm','mla','mad','fmaxnm','fminnmv','sdiv','cntd','decd','cnth','not','cmphi','cntb','cmpls','sdivr','fadda','frecpe','lastb','tbl','sminv','smax','smin','uunpkhi','uunpklo','uqdecd','punpkhi','punpklo','index','sxtw','eor'],
+    'control': ['incw','whilelo','sel','ptrue','bic','pfalse','incp','ptest','rdvl','zip2','zip1','uzp1','rev'],
+    'mem-read': ['ld1rw','ld1w','ldr','ld1d','ld1rd','ld1b','ld1sw'],
+    'mem-write': ['st1w','str','st1b','st1d'],
+    'move': ['movprfx','mov','lsl','fmov'],
+    'A64': ['A64'],
+    'NEON': ['NEON'],
+    'other': ['UNKNOWN']
+  }
+
+  for (type, ops) in catmap.items():
+    if op in ops:
+      return type
+
+  return 'other'
+
+# Sets the optype column of ops results to the op group of each op. `df` is modified in place.
+def categorise(df):
+  df['optype'] = df.op.apply(get_op_category)
+  # A64 and NEON opcodes can have the same names as SVE ones, so use their instruction set instead
+  if 'isa' in df.columns:
+    df.loc[df.isa == 'a64', 'optype']  = 'A64'
+    df.loc[df.isa == 'neon', 'optype'] = 'NEON'
@@ -0,0 +1,181 @@
+# Profiling hooks for the Python tools.
+#
+# Tools register the --profile options with add_arguments() and call start() after parsing the arguments.
+# Code is then split into named stages:
+#
+#   with profiling.stage('read_df') as s:
+#     ...
+#     s.lines += nlines
+#     s.bytes += nbytes
+#
+# When profiling is enabled, the time spent in each stage is accumulated together with the amount of data processed,
+# and a JSON report with per-stage timings, throughput and peak RSS is written when the tool exits.
+# When profiling is disabled, stages cost next to nothing.
+
+import atexit
+import cProfile
+import json
+import os
+import os.path
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+# Data processed during a single stage invocation
+class Measurement:
+  def __init__(self):
+    self.lines = 0
+    self.bytes = 0
+
+  # Adds the size of the given files or directories to the bytes processed.
+  # Walking a dataset directory can take a while, so this does nothing when profiling is disabled.
+  def add_files(self, *paths):
+    if _profiler is None:
+      return
+    for p in paths:
+      if os.path.isdir(p):
+        self.bytes += sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(p) for f in files)
+      else:
+        self.bytes += os.path.getsize(p)
+
+# Totals for all the invocations of a stage
+class Stage:
+  def __init__(self, name):
+    self.name    = name
+    self.calls   = 0
+    self.seconds = 0.0
+    self.lines   = 0
+    self.bytes   = 0
+    # The peak RSS of the whole process when the stage ends, not the peak of the stage itself
+    self.process_peak_rss_kib = 0
+
+  def to_dict(self):
+    return {
+      'name':                 self.name,
+      'calls':                self.calls,
+      'seconds':              self.seconds,
+      'lines':                self.lines,
+      'bytes':                self.bytes,
+      'lines_per_s':          self.lines / self.seconds if self.seconds > 0 else None,
+      'mb_per_s':             self.bytes / 1e6 / self.seconds if self.seconds > 0 else None,
+      'process_peak_rss_kib': self.process_peak_rss_kib,
+    }
+
+class Profiler:
+  def __init__(self, tool, report, dump=None):
+    self.tool     = tool
+    self.report   = report
+    self.dump     = dump
+    self.stages   = {}
+    self.lock     = threading.Lock()
+    self.started  = datetime.now()
+    self.t0       = time.perf_counter()
+    self.cprofile = None
+
+    if dump:
+      self.cprofile = cProfile.Profile()
+      self.cprofile.enable()
+
+  def record(self, name, seconds, measurement):
+    rss = peak_rss_kib()
+    with self.lock:
+      if name not in self.stages:
+        self.stages[name] = Stage(name)
+      s = self.stages[name]
+      s.calls                += 1
+      s.seconds              += seconds
+      s.lines                += measurement.lines
+      s.bytes                += measurement.bytes
+      s.process_peak_rss_kib  = max(s.process_peak_rss_kib, rss)
+
+  def finish(self):
+    if self.cprofile:
+      self.cprofile.disable()
+      self.cprofile.dump_stats(self.dump)
+      print("Profile dumped to", self.dump, file=sys.stderr)
+
+    report = {
+      'tool':          self.tool,
+      'tool_version':  tool_version(),
+      'argv':          sys.argv,
+      'python':        platform.python_version(),
+      'host':          platform.node(),
+      'started':       self.started.isoformat(timespec='seconds'),
+      'total_seconds': time.perf_counter() - self.t0,
+      'peak_rss_kib':  peak_rss_kib(),
+      'stages':        [s.to_dict() for s in self.stages.values()],
+    }
+
+    with open(self.report, 'w') as f:
+      json.dump(report, f, indent=2)
+    print("Profiling report saved to", self.report, file=sys.stderr)
+
+
+_profiler = None
+
+# Returns the peak resident set size of this process, in KiB
+def peak_rss_kib():
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # macOS reports bytes, Linux reports KiB
+  return rss // 1024 if sys.platform == 'darwin' else rss
+
+# Returns the commit of the tools being run, so that reports from different versions can be told apart
+def tool_version():
+  repo = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+  try:
+    return subprocess.check_output(['git', '-C', repo, 'describe', '--always', '--dirty'],
+                                   stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def add_arguments(parser):
+  group = parser.add_argument_group('profiling options')
+  group.add_argument('--profile', action='store_true',
+                     help='record per-stage timings, throughput and peak memory use and save them as a JSON report')
+  group.add_argument('--profile-report', metavar='FILE',
+                     help='with --profile, save the report to %(metavar)s (default: profile-<tool>-<timestamp>.json)')
+  group.add_argument('--profile-dump', metavar='FILE',
+                     help='with --profile, also save a cProfile dump to %(metavar)s, for use with pstats or snakeviz')
+
+# Enables profiling if requested on the command line; `tool` is the name recorded in the report
+def start(tool, args):
+  global _profiler
+
+  if not args.profile:
+    for opt, value in (('--profile-report', args.profile_report), ('--profile-dump', args.profile_dump)):
+      if value:
+        print(f"Warning: {opt} is ignored without --profile.")
+    return
+
+  report = args.profile_report
+  if not report:
+    report = f"profile-{tool}-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+  # Tools may change directory, so resolve the paths now
+  report = os.path.abspath(report)
+  dump   = os.path.abspath(args.profile_dump) if args.profile_dump else None
+
+  _profiler = Profiler(tool, report, dump)
+  atexit.register(_profiler.finish)
+
+def enabled():
+  return _profiler is not None
+
+# Times a stage of a tool; the yielded Measurement can be used to record the lines and bytes processed
+@contextmanager
+def stage(name):
+  m = Measurement()
+  if _profiler is None:
+    yield m
+    return
+
+  t0 = time.perf_counter()
+  try:
+    yield m
+  finally:
+    _profiler.record(name, time.perf_counter() - t0, m)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import pipeline, profiling
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Parse, merge, post-process and plot a campaign of results directories in a single process')
+
+  parser.add_argument('-i', '--isa', choices=['a64','sve','both'], default='sve',
+                      help='instruction set(s) to count opcodes for (default: %(default)s)')
+  parser.add_argument('--instrace', action='store_true', help='include the outputs of the instrace tools')
+  parser.add_argument('--timeline', type=int, metavar='N', help='include the memory access timeline, in windows of %(metavar)s accesses')
+  parser.add_argument('--gather-scatter', action='store_true', help='include the gather/scatter element accounting')
+  parser.add_argument('--hotspots', action='store_true', help='include the per-instruction memory accesses')
+  parser.add_argument('-g', '--graph', action='store_true', help='plot each application')
+  parser.add_argument('-e', '--export', metavar='DIR', help='write the merged results to %(metavar)s')
+  parser.add_argument('-f', '--format', choices=['pickle', 'parquet'], default='pickle',
+                      help='with --export, a pickle and CSV file per result type, or a Parquet dataset (default: %(default)s)')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('results', nargs='+', help='path to a results directory')
+
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  profiling.start('campaign-summary', args)
+
+  results = pipeline.summary(args.results, plot_results=args.graph, export_root=args.export, format=args.format,
+                             isa=args.isa, instrace=args.instrace, timeline=args.timeline,
+                             gather_scatter=args.gather_scatter, hotspots=args.hotspots)
+
+  # Total SVE ops of each run, by width
+  ops = results['ops']
+  sve = ops[ops.isa == 'sve']
+  print("Total SVE ops:")
+  print(sve.groupby(['application', 'version', 'svewidth'])['count'].sum().unstack('svewidth').to_string())
+
+  for type, df in results.items():
+    print(f"{type}: {len(df):,} rows")
+
+if __name__ == '__main__':
+  main()
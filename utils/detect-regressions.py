@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import dataset, profiling
+
+# A run is identified by these columns and its timestamp
+KEYS = ['application', 'version', 'svewidth']
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Compare the latest run of each application, version and SVE width to an earlier run')
+
+  parser.add_argument('--mem-analyze', metavar='DATA', help='merged mem-analyze results, to compare gather/scatter shares')
+  parser.add_argument('--mem-bundle', metavar='DATA', help='merged mem-bundle results, to compare active lanes')
+  parser.add_argument('-b', '--baseline', choices=['previous', 'first'], default='previous',
+                      help='compare to the previous run or to the first run (default: %(default)s)')
+  parser.add_argument('-t', '--threshold', type=float, default=5, metavar='T',
+                      help='flag counts that change by more than %(metavar)s%%, and percentages that change by more than %(metavar)s points (default: %(default)s)')
+  parser.add_argument('--min-count', type=int, default=1000, metavar='N',
+                      help='ignore counts below %(metavar)s in both runs (default: %(default)s)')
+  parser.add_argument('-a', '--application', action='append', help='check only the given application; can be repeated')
+  parser.add_argument('-o', '--output', metavar='CSV', help='save all the comparisons, flagged or not, to %(metavar)s')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('ops', help='merged ops results, in CSV or DataFrame pickle format, or a Parquet dataset directory')
+
+  return parser.parse_args()
+
+
+###### metrics ######
+# Each metric function returns a long DataFrame with the run keys, timestamp, metric, value and kind columns.
+# Metrics of kind 'count' are compared by relative change, and metrics of kind 'pct' by the difference in points.
+
+def ops_metrics(ops):
+  sve = ops[~ops.op.isin(['A64', 'NEON'])]
+  if 'isa' in sve.columns:
+    sve = sve[sve.isa == 'sve']
+
+  total = sve.groupby(KEYS + ['timestamp'], as_index=False)['count'].sum()
+  total['metric'] = 'total-sve-ops'
+  metrics = [total]
+
+  if 'optype' in ops.columns:
+    groups = ops.groupby(KEYS + ['timestamp', 'optype'], as_index=False)['count'].sum()
+    groups['metric'] = 'optype:' + groups.optype
+    metrics.append(groups.drop(columns='optype'))
+  else:
+    print("Warning: no optype column in the ops results; run update-op-type.py to compare op groups.")
+
+  df = pd.concat(metrics, ignore_index=True).rename(columns={'count': 'value'})
+  df['kind'] = 'count'
+  return df
+
+def analyze_metrics(analyze):
+  analyze = analyze[analyze.type.isin(['load', 'store'])].copy()
+  sve     = analyze.sve.where(analyze.sve > 0)
+
+  analyze['gather-scatter'] = analyze['sve-gather-scatter'] / sve * 100
+  analyze['contig-dislanes'] = analyze['sve-contig-dislanes'] / analyze['sve-contiguous'].where(analyze['sve-contiguous'] > 0) * 100
+
+  df = analyze.melt(id_vars=KEYS + ['timestamp', 'type'], value_vars=['gather-scatter', 'contig-dislanes'],
+                    var_name='metric', value_name='value')
+  df['metric'] = 'pct-' + df.type + '-' + df.metric
+  df['kind']   = 'pct'
+  return df.drop(columns='type').dropna(subset=['value'])
+
+# Joins the rows of the latest and baseline runs side by side, using the ranks in `runs`.
+# Rows that only exist in one of the runs are kept, with the other side missing.
+def join_runs(df, runs, baseline, on):
+  ranked = df.merge(runs, on=KEYS + ['timestamp'])
+  latest = ranked[ranked['rank'] == 1]
+  base   = ranked[ranked['rank'] == (2 if baseline == 'previous' else ranked['runs'])]
+
+  joined = latest.merge(base, on=KEYS + on, how='outer', suffixes=('', '-baseline'))\
+                 .drop(columns=['rank', 'rank-baseline', 'runs', 'runs-baseline'])
+  for c in ['timestamp', 'timestamp-baseline']:
+    joined[c] = joined.groupby(KEYS)[c].transform('first')
+
+  return joined.dropna(subset=['timestamp', 'timestamp-baseline'])
+
+# Compares the metrics of the latest and baseline runs
+def compare_metrics(metrics, runs, baseline, min_count):
+  df = join_runs(metrics, runs, baseline, ['metric', 'kind'])
+  df[['value', 'value-baseline']] = df[['value', 'value-baseline']].fillna(0)
+
+  # Counts are compared by relative change, percentages by the difference in points
+  base         = df['value-baseline']
+  is_count     = df.kind == 'count'
+  df['change'] = (df.value - base).astype(float)
+  df.loc[is_count & (base > 0), 'change']  = df.change / base * 100
+  df.loc[is_count & (base == 0), 'change'] = float('inf') # Ops that were not used before
+
+  return df[~is_count | (df[['value', 'value-baseline']].max(axis=1) >= min_count)]
+
+# Compares the active lanes histograms of the latest and baseline runs.
+# The change is the total variation distance between the histograms, in percentage points.
+def compare_bundle(bundle, runs, baseline):
+  hist = join_runs(bundle, runs, baseline, ['active-bits'])
+  hist['diff'] = (hist['pct-accesses'].fillna(0) - hist['pct-accesses-baseline'].fillna(0)).abs()
+
+  df = hist.groupby(KEYS + ['timestamp', 'timestamp-baseline'], as_index=False)['diff'].sum()
+  df['change'] = df['diff'] / 2
+  df['metric'] = 'active-lanes-histogram'
+  df['kind']   = 'pct'
+  return df.drop(columns='diff')
+
+
+def main():
+  args = parse_args()
+  profiling.start('detect-regressions', args)
+
+  ops = dataset.read_results(args.ops, application=args.application)
+
+  # Rank the runs of each application, version and width, latest first
+  with profiling.stage('rank') as m:
+    runs = ops[KEYS + ['timestamp']].drop_duplicates()
+    runs['rank'] = runs.groupby(KEYS).timestamp.rank(method='dense', ascending=False)
+    runs['runs'] = runs.groupby(KEYS)['rank'].transform('max')
+    runs = runs[runs.runs > 1]
+    m.lines = len(runs)
+
+  if len(runs) == 0:
+    print("No application, version and width has been run more than once.")
+    return
+
+  with profiling.stage('compare') as m:
+    metrics = [ops_metrics(ops)]
+    if args.mem_analyze:
+      metrics.append(analyze_metrics(dataset.read_results(args.mem_analyze, application=args.application)))
+    metrics = pd.concat(metrics, ignore_index=True)
+    m.lines = len(metrics)
+
+    df = compare_metrics(metrics, runs, args.baseline, args.min_count)
+    if args.mem_bundle:
+      bundle = dataset.read_results(args.mem_bundle, application=args.application)
+      df     = pd.concat([df, compare_bundle(bundle, runs, args.baseline)], ignore_index=True)
+
+    df['flagged'] = df.change.abs() > args.threshold
+
+  flagged = df[df.flagged].sort_values('change', key=abs, ascending=False)
+  print(f"Compared {len(runs[runs['rank'] == 1])} runs to their {args.baseline} run: {len(flagged)} significant changes")
+  for r in flagged.to_dict('records'):
+    unit = '%' if r['kind'] == 'count' else ' points'
+    print(f"  {r['application']} {r['version']} sve{r['svewidth']}: {r['metric']}: {r['change']:+.1f}{unit}"
+          f" ({r['timestamp']} vs. {r['timestamp-baseline']})")
+
+  if args.output:
+    df.to_csv(args.output, index=False)
+    print("Saved all comparisons to", args.output)
+
+  if len(flagged) > 0:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
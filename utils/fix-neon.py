@@ -1,53 +1,48 @@
 #!/usr/bin/env python3
 
+import argparse
+import os.path
 import sys
 
-import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import dataset, postprocess, profiling
 
-# Replaces the names of all versions of an app with just the basename
-def rename_versions(df, app):
-  variations = [a for a in df.application.unique() if a.startswith(f'{app}-')]
-  print("Renaming", variations, f"to '{app}'")
-  df.loc[df.application.str.startswith(f'{app}-'), 'application'] = app
+def parse_args():
+  parser = argparse.ArgumentParser()
 
-# Sets a bogus SVE width for scalar results to make plotting easier
-def fix_novec(df):
-  novec_svewidth = 0
-  print(f"novec: Setting svewidth = {novec_svewidth}")
-  df.loc[df.application.str.endswith(f'-novec'), 'svewidth'] = novec_svewidth
+  profiling.add_arguments(parser)
 
-# Sets a bogus SVE width for NEON results to make plotting easier
-def fix_neon(df):
-  neon_svewidth = 1
-  print(f"neon: Setting svewidth = {neon_svewidth}")
-  df.loc[df.application.str.endswith(f'-neon'), 'svewidth'] = neon_svewidth
+  parser.add_argument('data', help='the merged results, in CSV or DataFrame pickle format, or a Parquet dataset directory')
 
+  return parser.parse_args()
 
-def main():
-  if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
-    print("Usage: fix-neon.py <pickle/csv>")
-    sys.exit(1)
 
-  filename = sys.argv[1]
-  if filename.endswith('.csv'):
-    df = pd.read_csv(filename)
-  else:
-    df = pd.read_pickle(filename)
+def main():
+  args = parse_args()
+  profiling.start('fix-neon', args)
+
+  filename = args.data
+  with profiling.stage('read') as m:
+    m.add_files(filename)
+    df      = dataset.read(filename)
+    m.lines = len(df)
   original_records = len(df)
   print(f"Read {original_records} records")
 
-  fix_novec(df)
-  fix_neon(df)
-
-  apps = [a.replace('-sve', '') for a in df.application.unique() if a.endswith('-sve')]
-  for app in apps:
-    rename_versions(df, app)
+  with profiling.stage('fix') as m:
+    m.lines = len(df)
+    postprocess.fix_versions(df)
 
   new_records = len(df)
-  if new_records == original_records:
+  if new_records == original_records and dataset.is_dataset(filename):
+    with profiling.stage('write'):
+      dataset.rewrite_dataset(df, filename)
+    print(f"Wrote {new_records} records")
+  elif new_records == original_records:
     basename = filename[:filename.rfind('.')]
-    df.to_pickle(basename + '.pickle')
-    df.to_csv(basename + '.csv', index=False)
+    with profiling.stage('write'):
+      df.to_pickle(basename + '.pickle')
+      df.to_csv(basename + '.csv', index=False)
     print(f"Wrote {new_records} records")
   else:
     print(f"Refusing to write {new_records} records. Something went wrong")
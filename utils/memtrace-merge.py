@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import memtrace, profiling
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Merge native and SVE memory traces into a single trace in program order')
+
+  parser.add_argument('-f', '--format', choices=['text', 'binary'], default='text',
+                      help='output format: text, in the same format as the ArmIE traces, or compact binary records (default: %(default)s)')
+  parser.add_argument('-b', '--binary', metavar='BINARY',
+                      help='merge memtrace.%(metavar)s*.log and sve-memtrace.%(metavar)s*.log in the current directory')
+  parser.add_argument('-o', '--output', required=True, help='the merged trace')
+  parser.add_argument('--chunk', type=int, default=memtrace.CHUNK_RECORDS, metavar='N',
+                      help='read up to %(metavar)s records at a time from each trace (default: %(default)s)')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('traces', nargs='*',
+                      help='traces to merge; traces named sve-memtrace.* are taken to be SVE traces')
+
+  return parser.parse_args()
+
+def main():
+  args = parse_args()
+  profiling.start('memtrace-merge', args)
+
+  sources = [(t, os.path.basename(t).startswith('sve-')) for t in args.traces]
+  if args.binary:
+    sources += memtrace.binary_sources(args.binary)
+  if not sources:
+    print("No traces to merge.")
+    sys.exit(1)
+
+  with profiling.stage('merge') as m:
+    m.add_files(*(p for p, _ in sources))
+
+    if args.format == 'text':
+      # Keep the artifacts and the addresses exactly as they are, like the instrace tools merger
+      chunks = memtrace.merge_chunks(sources, chunksize=args.chunk, skip_artifacts=False, raw=True)
+      memtrace.write_text(chunks, args.output)
+    else:
+      chunks = memtrace.merge_chunks(sources, chunksize=args.chunk)
+      memtrace.write_binary(chunks, args.output)
+
+  print(f"Merged {len(sources)} traces into {args.output}")
+
+if __name__ == '__main__':
+  main()
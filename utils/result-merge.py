@@ -1,92 +1,66 @@
 #!/usr/bin/env python3
 
+import argparse
 import os.path
-import re
 import sys
 
 from datetime import datetime
 
-import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import dataset, pipeline, profiling
 
-# Reads the run configuration from a results directory
-def read_config(result):
-  cfg_path = os.path.join(result, 'run.cfg')
+def parse_args():
+  parser = argparse.ArgumentParser()
 
-  if not os.path.exists(cfg_path):
-    print(result + ':', "Could not read configuration from run.cfg")
-    return None
-
-  cfg     = {}
-  options = ['svewidth', 'time']
-  with open(cfg_path, 'r') as f:
-    for line in f:
-      for opt in options:
-        if opt in line:
-          cfg[opt] = re.split(r'[=\s]+', line)[1]
-          break
-
-  # Change the name of some keys
-  cfg['timestamp'] = cfg.pop('time')
-
-  return cfg
-
-# Reads an existing DataFrame from the results directory.
-# Type is {ops, mem-analyze, mem-bundle}, corresponding to the different types of results we can collect
-def read_df(result, type):
-  pickle_path = os.path.join(result, type + '.pickle')
-  csv_path    = os.path.join(result, type + '.csv')
-
-  if os.path.exists(pickle_path):
-    df = pd.read_pickle(pickle_path)
-  elif os.path.exists(csv_path):
-    df = pd.read_csv(csv_path)
-  else:
-    print(f"{result}: Could not find either {type}.pickle or {type}.csv")
-    return None
-
-  runcfg = read_config(result)
-  if runcfg is None:
-    return None
+  parser.add_argument('-f', '--format', choices=['pickle', 'parquet'], default='pickle',
+                      help='output format: a pickle and CSV file per result type, or a Parquet dataset partitioned by type, application and svewidth (default: %(default)s)')
+  parser.add_argument('-o', '--output', metavar='DIR',
+                      help='with --format parquet, add the results to the dataset in %(metavar)s (default: a new merged_<timestamp> directory)')
 
-  df['svewidth']  = runcfg['svewidth']
-  df['timestamp'] = runcfg['timestamp']
+  profiling.add_arguments(parser)
 
-  return df
+  parser.add_argument('results', nargs='+', help='path to a results directory')
 
+  return parser.parse_args()
 
 def merge(results, type):
-  dfs = [read_df(r, type) for r in results]
+  dfs = [pipeline.read_exported(r, type) for r in results]
   if all(df is None for df in dfs):
     return None
 
-  print(len(dfs), [len(df) for df in dfs])
+  print(len(dfs), [len(df) for df in dfs if df is not None])
 
-  merged_df = pd.concat(dfs, ignore_index=True)[dfs[0].columns] # The indexing is so that the column order is kept
+  merged_df = pipeline.concat(dfs)
   print(merged_df)
   return merged_df
 
-def save(df, type, fname):
-  df.to_pickle(fname + '.pickle')
-  df.to_csv(fname + '.csv', index=False)
-  print("Merged", type, "in", fname+'.pickle', "and", fname+'.csv')
+# Adds the merged results to a Parquet dataset; existing results in the dataset are kept
+def save_dataset(df, type, root):
+  dataset.write_dataset(df, root, type, append=True)
+  print("Merged", type, "in", os.path.join(root, type))
 
 
-
-def print_help():
-  print('Usage: result-merge.py [-h] [results ...]')
-  sys.exit()
-
 def main():
-  if len(sys.argv) < 2 or sys.argv[1] == '-h' or sys.argv[1] == '--help':
-    print_help()
+  args = parse_args()
+  profiling.start('result-merge', args)
+  ts   = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
-  for result_type in ['ops', 'mem-analyze', 'mem-bundle']:
-    merged_df = merge(sys.argv[1:], result_type)
+  if args.output and args.format != 'parquet':
+    print("Warning: --output is only used with --format parquet.")
 
-    if merged_df is not None:
-      save(merged_df, result_type, f'merged_{result_type}_' + datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
-    else:
+  for result_type in pipeline.TYPES:
+    merged_df = merge(args.results, result_type)
+
+    if merged_df is None:
       print("Found no results to merge for type:", result_type)
+    elif args.format == 'parquet':
+      with profiling.stage('save'):
+        save_dataset(merged_df, result_type, args.output if args.output else f'merged_{ts}')
+    else:
+      fname = f'merged_{result_type}_{ts}'
+      with profiling.stage('save'):
+        pipeline.save(merged_df, fname)
+      print("Merged", result_type, "in", fname+'.pickle', "and", fname+'.csv')
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import argparse
+import os.path
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from sve_analysis import dataset, profiling
+
+# A model is fitted for each application and version
+KEYS = ['application', 'version']
+
+# The vector lengths allowed by SVE
+SVE_WIDTHS = list(range(128, 2049, 128))
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Fit how op counts and lane utilisation scale with the SVE width, and predict them at the widths that were not run')
+
+  parser.add_argument('--mem-bundle', metavar='DATA', help='merged mem-bundle results, to also model lane utilisation')
+  parser.add_argument('-w', '--svewidth', type=int, action='append',
+                      help='predict only the given SVE width; can be repeated (default: all the widths that were not run)')
+  parser.add_argument('-a', '--application', action='append', help='model only the given application; can be repeated')
+  parser.add_argument('--min-count', type=int, default=1000, metavar='N',
+                      help='leave out ops with fewer than %(metavar)s executions at every width from the error summary (default: %(default)s)')
+  parser.add_argument('-o', '--output', metavar='FILE',
+                      help='save the measured and predicted values to %(metavar)s, in CSV or DataFrame pickle format depending on the extension')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('ops', help='merged ops results, in CSV or DataFrame pickle format, or a Parquet dataset directory')
+
+  return parser.parse_args()
+
+# Keeps the latest run of each application, version and width.
+# Results whose width was set to a placeholder by fix-neon.py (no-vec and NEON) are left out.
+def latest_runs(df):
+  df = df[df.svewidth >= SVE_WIDTHS[0]]
+  if 'timestamp' in df.columns:
+    df = df[df.timestamp == df.groupby(KEYS + ['svewidth']).timestamp.transform('max')]
+  return df
+
+
+###### model ######
+# Each value is modelled as y = a + b * x, with x = 128 / svewidth: the part of the work that is vectorised
+# scales with the number of loop iterations, while the rest (setup, remainders, scalar code) stays the same.
+# The coefficients are fitted by least squares, in closed form from the sums over the measured widths,
+# so all the models are fitted at once with a groupby.
+
+def _sums(df, groups):
+  x = 128 / df.svewidth
+  y = df.value
+  return pd.DataFrame({'n': 1, 'sx': x, 'sy': y, 'sxx': x*x, 'sxy': x*y})\
+           .assign(**{g: df[g] for g in groups}).groupby(groups).sum()
+
+# Solves the least squares equations; models with fewer than two widths have no solution
+def _solve(s):
+  det = s.n * s.sxx - s.sx**2
+  b   = (s.n * s.sxy - s.sx * s.sy) / det.where((s.n >= 2) & (det > 0))
+  a   = (s.sy - b * s.sx) / s.n
+  return a, b
+
+# Fits a model for each group of `df` and returns its coefficients and leave-one-out error.
+# The error is the mean relative error, in percent, when each measured width is predicted from the others,
+# so it needs at least three widths.
+def fit(df, groups):
+  s = _sums(df, groups)
+  a, b = _solve(s)
+
+  # Refit without each row, by taking its own terms out of the sums
+  rows = df.join(s, on=groups)
+  x    = 128 / rows.svewidth
+  held = rows[['n', 'sx', 'sy', 'sxx', 'sxy']] - pd.DataFrame({'n': 1, 'sx': x, 'sy': rows.value, 'sxx': x*x, 'sxy': x*rows.value})
+  a_loo, b_loo = _solve(held)
+
+  predicted = (a_loo + b_loo * x).clip(lower=0)
+  rows['error'] = ((predicted - rows.value).abs() / rows.value.where(rows.value > 0) * 100).where(held.n >= 2)
+
+  model = pd.DataFrame({'a': a, 'b': b, 'widths': s.n.astype(int)})
+  model['error'] = rows.groupby(groups).error.mean()
+  return model.reset_index()
+
+# Evaluates the models at the given widths
+def predict(model, widths, clip=None):
+  df = model.merge(pd.DataFrame({'svewidth': widths}), how='cross')
+  df['predicted'] = (df.a + df.b * 128 / df.svewidth).clip(lower=0, upper=clip)
+  return df
+
+
+###### inputs ######
+# Returns the count of each op at each measured width, and the total SVE op count.
+# `ops` must have an `sve` column marking SVE ops.
+# Ops that were not executed at some of the widths of an application and version count as 0 there.
+def op_counts(ops):
+  ops = ops.groupby(KEYS + ['svewidth', 'op', 'sve'], as_index=False)['count'].sum()\
+           .rename(columns={'count': 'value'})
+
+  widths = ops[KEYS + ['svewidth']].drop_duplicates()
+  names  = ops[KEYS + ['op', 'sve']].drop_duplicates()
+  grid   = widths.merge(names, on=KEYS).merge(ops, on=KEYS + ['svewidth', 'op', 'sve'], how='left').fillna({'value': 0})
+
+  total = grid[grid.sve].groupby(KEYS + ['svewidth'], as_index=False).value.sum()
+  return grid.drop(columns='sve'), total
+
+# Returns the lane utilisation at each measured width: the mean fraction of the vector used by SVE memory accesses
+def lane_utilisation(bundle):
+  bundle = bundle.assign(bits=pd.to_numeric(bundle['active-bits']) * pd.to_numeric(bundle['num-accesses']),
+                         accesses=pd.to_numeric(bundle['num-accesses']))
+  df = bundle.groupby(KEYS + ['svewidth'], as_index=False)[['bits', 'accesses']].sum()
+  df['value'] = df.bits / (df.accesses * df.svewidth)
+  return df[df.accesses > 0].drop(columns=['bits', 'accesses'])
+
+
+def main():
+  args = parse_args()
+  profiling.start('width-model', args)
+
+  ops = latest_runs(dataset.read_results(args.ops, application=args.application))
+
+  # Only SVE ops count towards the total; A64 and NEON are modelled as ops of their own
+  is_sve = ~ops.op.isin(['A64', 'NEON'])
+  if 'isa' in ops.columns:
+    # A64 and NEON opcodes can have the same names as SVE ones
+    opcode  = ops.isa.fillna('sve') != 'sve'
+    is_sve &= ~opcode
+    ops     = ops.assign(op=ops.op.where(~opcode | ops.op.isin(['A64', 'NEON']), ops.isa + ':' + ops.op))
+  ops = ops.assign(sve=is_sve)
+
+  with profiling.stage('fit') as m:
+    counts, total = op_counts(ops)
+    counts = pd.concat([counts, total.assign(op='total-sve')], ignore_index=True)
+    m.lines = len(counts)
+
+    models = fit(counts, KEYS + ['op']).assign(metric='count')
+    if args.mem_bundle:
+      lanes  = lane_utilisation(latest_runs(dataset.read_results(args.mem_bundle, application=args.application)))
+      models = pd.concat([models, fit(lanes, KEYS).assign(metric='lane-utilisation', op='')], ignore_index=True)
+
+  # Predict at every SVE width, so the fitted values can be compared to the measured ones
+  measured = pd.concat([counts.assign(metric='count'),
+                        lanes.assign(metric='lane-utilisation', op='') if args.mem_bundle else None], ignore_index=True)\
+               .rename(columns={'value': 'measured'})
+  results  = pd.concat([predict(models[models.metric == 'count'], SVE_WIDTHS),
+                        predict(models[models.metric == 'lane-utilisation'], SVE_WIDTHS, clip=1)], ignore_index=True)\
+               .merge(measured, on=KEYS + ['metric', 'op', 'svewidth'], how='left')
+
+  unmeasured = results[results.measured.isna() & results.predicted.notna()]
+  if args.svewidth:
+    unmeasured = unmeasured[unmeasured.svewidth.isin(args.svewidth)]
+
+  # Ops that are rarely executed have large relative errors that don't matter
+  largest = counts.groupby(KEYS + ['op']).value.max().rename('max-count').reset_index()
+  errors  = models.merge(largest, on=KEYS + ['op'], how='left')
+
+  for (app, version), model in models.groupby(KEYS):
+    widths = sorted(measured[(measured.application == app) & (measured.version == version)].svewidth.unique())
+    print(f"{app} {version}: measured at {', '.join(str(w) for w in widths)} bits")
+    if len(widths) < 2:
+      print("  Cannot fit a model with a single width.")
+      continue
+
+    err   = errors[(errors.application == app) & (errors.version == version)].set_index('op')
+    total = err.loc['total-sve'] if 'total-sve' in err.index else None
+    big   = err[(err.metric == 'count') & (err['max-count'] >= args.min_count) & (err.index != 'total-sve')]
+    if len(widths) < 3:
+      print("  Held-out error: needs at least three widths")
+    else:
+      print("  Held-out error: total SVE ops {:.1f}%, median op {:.1f}%, worst op {:.1f}% ({}, {} ops with at least {:,} executions)".format(
+        total.error if total is not None else np.nan, big.error.median(), big.error.max(),
+        big.error.idxmax() if big.error.notna().any() else '-', len(big), args.min_count))
+
+    pred = unmeasured[(unmeasured.application == app) & (unmeasured.version == version)]
+    sve  = pred[(pred.metric == 'count') & (pred.op == 'total-sve')]
+    if len(sve) > 0:
+      print("  Predicted total SVE ops:", ', '.join("{}: {:,.0f}".format(r.svewidth, r.predicted) for r in sve.itertuples()))
+    lanes_pred = pred[pred.metric == 'lane-utilisation']
+    if len(lanes_pred) > 0:
+      print("  Predicted lane utilisation (held-out error {:.1f}%):".format(lanes_pred.error.iloc[0]),
+            ', '.join("{}: {:.1f}%".format(r.svewidth, r.predicted * 100) for r in lanes_pred.itertuples()))
+
+  if args.output:
+    columns = KEYS + ['metric', 'op', 'svewidth', 'measured', 'predicted', 'error', 'a', 'b', 'widths']
+    with profiling.stage('write'):
+      dataset.write(results[columns].sort_values(KEYS + ['metric', 'op', 'svewidth'], ignore_index=True), args.output)
+    print("Saved the model predictions to", args.output)
+
+if __name__ == '__main__':
+  main()
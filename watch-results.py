@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import os.path
+import shutil
+import subprocess as sp
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sve_analysis import pipeline, profiling
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Post-process results directories while the wrapper is still running')
+
+  parser.add_argument('-i', '--interval', type=float, default=10, metavar='S',
+                      help='check for new artifacts every %(metavar)s seconds (default: %(default)s)')
+  parser.add_argument('-j', '--jobs', type=int, default=2, metavar='N',
+                      help='run up to %(metavar)s post-processing steps at the same time (default: %(default)s)')
+  parser.add_argument('--armie-dir', metavar='DIR',
+                      help='ArmIE installation directory, used for decoding (default: found from armie in PATH)')
+  parser.add_argument('--forever', action='store_true',
+                      help='keep watching for new results directories instead of stopping once all of them are complete')
+
+  merge_group = parser.add_argument_group('merge options')
+  merge_group.add_argument('--merge', action='store_true',
+                           help='merge the exported results of all the directories once they are complete')
+  merge_group.add_argument('-f', '--format', choices=['pickle', 'parquet'], default='pickle',
+                           help='format of the merged results (default: %(default)s)')
+  merge_group.add_argument('-o', '--output', metavar='DIR',
+                           help='with --format parquet, add the results to the dataset in %(metavar)s')
+
+  profiling.add_arguments(parser)
+
+  parser.add_argument('results', nargs='+',
+                      help='results directories to watch; glob patterns are expanded again at every check')
+
+  return parser.parse_args()
+
+# Returns the path of a marker file written by armie-wrapper.sh when the artifacts of a stage are complete.
+# The stages are 'opcodes' and 'memtrace' for each binary, and 'complete' for the whole run.
+def marker(results, stage, binary=None):
+  name = f'.{stage}_{binary}.done' if binary else f'.{stage}'
+  return os.path.join(results, name)
+
+# Returns the binaries the wrapper has started running so far
+def get_binaries(results):
+  with open(os.path.join(results, 'binaries.lst')) as f:
+    return [b.strip() for b in f.readlines()[1:] if b.strip()]
+
+# Runs a command, sending its output to a log file for the step
+def run(cmd, log, **kwargs):
+  os.makedirs(os.path.dirname(log), exist_ok=True)
+  with open(log, 'a') as f:
+    sp.run(cmd, stdout=kwargs.pop('stdout', f), stderr=f, check=True, universal_newlines=True, **kwargs)
+
+
+###### post-processing steps ######
+# Each step writes its outputs under a temporary name and renames them once complete,
+# so that the presence of an output means the step has finished.
+
+# Decodes the SVE instructions recorded by the oprecord client
+def decode(results, binary, armie_dir, log):
+  with open(os.path.join(results, f'undecoded_{binary}.txt')) as f:
+    words = ''.join(line.split()[2] + '\n' for line in f if line.strip())
+
+  decoded = os.path.join(results, f'decoded_{binary}.txt')
+  with open(decoded + '.tmp', 'w') as out:
+    run([os.path.join(armie_dir, 'bin64', 'enc2instr.py')], log, input=words, stdout=out)
+  os.rename(decoded + '.tmp', decoded)
+
+# Counts A64 and NEON instructions; the binary path is recorded in the opcodes marker
+def count_neon(results, binary, log):
+  with open(marker(results, 'opcodes', binary)) as f:
+    binary_path = f.read().strip()
+  trace = os.path.join(results, f'a64-undecoded_{binary}.txt')
+  disas = os.path.join(results, f'disas_{binary}.out')
+
+  count = os.path.join(results, f'a64-count_{binary}.txt')
+  with open(count + '.tmp', 'w') as out:
+    run([os.path.join(script_dir, 'count-neon.py'), '-d', disas, binary_path, trace], log, stdout=out)
+  os.rename(count + '.tmp', count)
+
+# Runs the instrace tools (merge, analyze, bundle) for a single binary
+def instrace(results, binary, log):
+  runcfg = pipeline.read_config(results)
+  if runcfg is None:
+    raise FileNotFoundError(os.path.join(results, 'run.cfg'))
+  run([os.path.join(script_dir, 'run-instrace-tools.sh'), results, runcfg['svewidth'], binary], log)
+
+# Exports the results of a complete run to DataFrames
+def export(results, has_opcodes, has_memtrace, log):
+  parser = os.path.join(script_dir, 'armie-output-parser.py')
+
+  if has_memtrace:
+    clean = os.path.join(script_dir, 'utils', 'clean-instrace-tools-output.sh')
+    if os.path.exists(clean):
+      run([clean, results], log)
+    run([parser, '--mem-count', '--export', results], log)
+  if has_opcodes:
+    run([parser, '--op-count', '--export', results], log)
+
+
+class Watcher:
+  def __init__(self, args, executor):
+    self.args      = args
+    self.executor  = executor
+    self.tasks     = {} # (results, binary, step) -> Future
+    self.exported  = set()
+
+    self.armie_dir = args.armie_dir
+    if not self.armie_dir and shutil.which('armie'):
+      self.armie_dir = os.path.dirname(os.path.dirname(shutil.which('armie')))
+
+  # Returns the results directories currently matching the command line arguments
+  def directories(self):
+    dirs = []
+    for pattern in self.args.results:
+      for d in sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]:
+        if os.path.isdir(d) and os.path.exists(os.path.join(d, 'binaries.lst')) and d not in dirs:
+          dirs.append(d)
+    return dirs
+
+  def submit(self, results, binary, step, fn, *args):
+    key = (results, binary, step)
+    if key in self.tasks:
+      return
+
+    log = os.path.join(results, 'watch-logs', f'{step}_{binary}.log' if binary else f'{step}.log')
+    print(f"{results}: {binary + ': ' if binary else ''}starting {step}")
+    self.tasks[key] = self.executor.submit(self.timed, results, binary, step, fn, *args, log)
+
+  def timed(self, results, binary, step, fn, *args):
+    t0 = time.perf_counter()
+    try:
+      with profiling.stage(step):
+        fn(results, *([binary] if binary else []), *args)
+    except (OSError, sp.CalledProcessError) as e:
+      print(f"{results}: {binary + ': ' if binary else ''}{step} failed: {e}. See {args[-1]}")
+      raise
+    print(f"{results}: {binary + ': ' if binary else ''}{step} done ({time.perf_counter() - t0:.1f}s)")
+
+  def pending(self, results):
+    return any(f is not None and not f.done() for (r, _, _), f in self.tasks.items() if r == results)
+
+  # Starts all the steps whose inputs are ready; returns true if the directory has been fully processed
+  def check(self, results):
+    binaries     = get_binaries(results)
+    has_opcodes  = False
+    has_memtrace = False
+
+    for b in binaries:
+      if os.path.exists(marker(results, 'opcodes', b)):
+        has_opcodes = True
+        if not os.path.exists(os.path.join(results, f'decoded_{b}.txt')):
+          if self.armie_dir:
+            self.submit(results, b, 'decode', decode, self.armie_dir)
+          elif (results, b, 'decode') not in self.tasks:
+            print(f"{results}: {b}: cannot decode without ArmIE; use --armie-dir")
+            self.tasks[(results, b, 'decode')] = None
+        if not os.path.exists(os.path.join(results, f'a64-count_{b}.txt')):
+          self.submit(results, b, 'count-neon', count_neon)
+
+      if os.path.exists(marker(results, 'memtrace', b)):
+        has_memtrace = True
+        if not any(os.path.exists(os.path.join(results, f'bundle.{b}.{ext}')) for ext in ('log', 'csv')):
+          self.submit(results, b, 'instrace', instrace)
+
+    if not os.path.exists(marker(results, 'complete')) or self.pending(results):
+      return False
+
+    if results not in self.exported:
+      self.exported.add(results)
+
+      # Only export the results whose steps have all succeeded, as the parser would fail on their missing outputs
+      failed = {s for _, _, s in self.failed(results)}
+      if has_opcodes and failed & {'decode', 'count-neon'}:
+        print(f"{results}: not exporting the op counts, as some of their steps failed or were skipped")
+        has_opcodes = False
+      if has_memtrace and 'instrace' in failed:
+        print(f"{results}: not exporting the memory results, as some of their steps failed")
+        has_memtrace = False
+
+      if has_opcodes or has_memtrace:
+        self.submit(results, None, 'export', export, has_opcodes, has_memtrace)
+        return False
+
+    return True
+
+  def run(self):
+    while True:
+      dirs     = self.directories()
+      complete = [self.check(d) for d in dirs]
+
+      if dirs and all(complete) and not self.args.forever:
+        return dirs
+      time.sleep(self.args.interval)
+
+  # Returns the steps that failed or were skipped, in all the directories or in `results` only.
+  # The steps must have finished.
+  def failed(self, results=None):
+    return [(r, b, s) for (r, b, s), f in self.tasks.items()
+            if (results is None or r == results) and (f is None or f.exception() is not None)]
+
+
+def main():
+  args = parse_args()
+  profiling.start('watch-results', args)
+
+  with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    watcher = Watcher(args, executor)
+    dirs    = watcher.run()
+
+  failed = watcher.failed()
+  if failed:
+    print("Failed steps:", ', '.join(f"{r}: {b + ' ' if b else ''}{s}" for r, b, s in failed))
+    sys.exit(1)
+
+  if args.merge:
+    cmd = [os.path.join(script_dir, 'utils', 'result-merge.py'), '--format', args.format]
+    if args.output:
+      cmd += ['--output', args.output]
+    with profiling.stage('merge'):
+      sp.run(cmd + dirs, check=True)
+
+  print("All done.")
+
+if __name__ == '__main__':
+  main()